@@ -1,12 +1,26 @@
 import streamlit as st
+from streamlit import runtime
 import requests
 import json
 import pandas as pd
 from datetime import datetime, timedelta
 import time
 import random
+import threading
+import argparse
+import uuid
+import sqlite3
+import os
+import bisect
+import zlib
+import csv
+import atexit
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -18,6 +32,91 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Mock data based on recent market conditions (Sept 24, 2025)
+BASE_PRICES = {
+    "SPY": 666.92,  # S&P 500 ETF
+    "QQQ": 575.73,  # NASDAQ ETF  
+    "DIA": 463.15,  # DOW ETF
+    "NVDA": 145.25, # NVIDIA
+    "AAPL": 184.50, # Apple
+    "MSFT": 425.75, # Microsoft
+    "GOOGL": 168.25, # Google
+    "TSLA": 267.88, # Tesla
+    "META": 495.67, # Meta
+    "AMZN": 187.45  # Amazon
+}
+
+def reference_price(symbol: str) -> float:
+    """Known base price, or a stable synthetic one derived from the ticker"""
+    if symbol in BASE_PRICES:
+        return BASE_PRICES[symbol]
+    return round(5 + (zlib.crc32(symbol.encode()) % 49500) / 100, 2)
+
+# Symbol Catalogue with Prefix Search
+class SymbolCatalogue:
+    """Symbols and company names in sorted indexes for bisect prefix search"""
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        self.by_symbol = {row["symbol"]: row for row in rows}
+        # Sorted tickers, and sorted (word, symbol) pairs from every name
+        self._symbols = sorted(self.by_symbol)
+        self._name_words = sorted(
+            (word, row["symbol"])
+            for row in rows
+            for word in row["name"].lower().replace(",", " ").split()
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "SymbolCatalogue":
+        """Read the catalogue CSV; the built-in tickers are always included"""
+        rows = {symbol: {"symbol": symbol, "name": symbol, "exchange": "", "reference_price": price}
+                for symbol, price in BASE_PRICES.items()}
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for record in csv.DictReader(f):
+                    symbol = (record.get("symbol") or "").strip().upper()
+                    if not symbol:
+                        continue
+                    price = (record.get("reference_price") or "").strip()
+                    rows[symbol] = {
+                        "symbol": symbol,
+                        "name": (record.get("name") or symbol).strip(),
+                        "exchange": (record.get("exchange") or "").strip(),
+                        "reference_price": float(price) if price else reference_price(symbol)
+                    }
+        except FileNotFoundError:
+            pass
+        return cls(list(rows.values()))
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.by_symbol
+    
+    def price(self, symbol: str) -> float:
+        return self.by_symbol[symbol]["reference_price"]
+    
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Ticker prefix matches first, then company-name word prefix matches"""
+        query = query.strip()
+        if not query:
+            return []
+        results = {}
+        prefix = query.upper()
+        i = bisect.bisect_left(self._symbols, prefix)
+        while i < len(self._symbols) and self._symbols[i].startswith(prefix) and len(results) < limit:
+            results[self._symbols[i]] = self.by_symbol[self._symbols[i]]
+            i += 1
+        
+        word = query.lower().split()[0]
+        i = bisect.bisect_left(self._name_words, (word, ""))
+        while i < len(self._name_words) and self._name_words[i][0].startswith(word) and len(results) < limit:
+            symbol = self._name_words[i][1]
+            results.setdefault(symbol, self.by_symbol[symbol])
+            i += 1
+        return list(results.values())
+
 # Adaptive RAG Configuration
 class AdaptiveRAGConfig:
     def __init__(self):
@@ -34,64 +133,982 @@ class AdaptiveRAGConfig:
             "cnbc_api"
         ]
         self.cache_duration = 300  # 5 minutes
+        self.cache_max_entries = 512
+        # Shared on-disk cache so restarts and other workers start warm
+        self.persistent_cache = True
+        self.cache_db_path = "market_cache.db"
+        self.cache_db_retention = 24 * 60 * 60  # seconds
+        self.tick_capacity = 4096  # ticks kept per symbol (~96 KB each)
+        self.refresh_interval = 5  # seconds between shared background polls
+        # symbol,name,exchange,reference_price; shipped next to this script
+        self.symbol_catalogue_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_symbols.csv")
+        # Append-only columnar tick recordings, one directory per day
+        self.record_ticks = False
+        self.recording_dir = "recordings"
+        # Latency metrics export (Prometheus text format) for local monitoring
+        self.metrics_export_path = "market_metrics.prom"
+        self.metrics_export_interval = 0  # seconds; 0 exports only on demand
         self.retry_attempts = 3
+        self.retry_backoff = 0.2  # seconds, doubled after each failed attempt
         self.timeout = 10
+        self.source_timeouts = {}  # per-source overrides of `timeout`
+        self.max_workers = 8
+        # Primary sources are simulated until provider keys are configured;
+        # set to False to query `primary_sources` over HTTP
+        self.simulate_sources = True
+        # Latency-aware routing, hedged requests and circuit breaking
+        self.adaptive_routing = True
+        self.ewma_alpha = 0.2
+        self.hedge_default_delay = 0.25  # seconds, used until a source has latency samples
+        self.breaker_failure_threshold = 3
+        self.breaker_cooldown = 30  # seconds
+
+# Persistent Quote Store
+class PersistentQuoteStore:
+    """SQLite (WAL mode) quote table that several worker processes can read concurrently"""
+    def __init__(self, path: str, retention: float):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS quotes (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        ''')
+        conn.execute("DELETE FROM quotes WHERE stored_at < ?", (time.time() - retention,))
+        conn.commit()
+    
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; each fetch thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def get(self, key: str) -> Optional[Tuple[float, Dict]]:
+        """(age in seconds, quote) for the stored entry, if any"""
+        try:
+            row = self._connection().execute(
+                "SELECT payload, stored_at FROM quotes WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return max(time.time() - row[1], 0.0), json.loads(row[0])
+    
+    def put(self, key: str, value: Dict):
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO quotes (key, payload, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            conn.commit()
+        except sqlite3.Error:
+            # The in-memory cache still holds the quote; persistence is best effort
+            pass
+
+# Quote Cache with TTL and LRU Eviction
+class MarketDataCache:
+    """Size-bounded LRU cache with monotonic-clock TTL and hit/miss counters"""
+    def __init__(self, ttl: float, max_entries: int, store: Optional[PersistentQuoteStore] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+    
+    def age(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return time.monotonic() - entry[0]
+    
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """Fresh entry or None; expired entries count as stale, not as hits"""
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        
+        # Memory miss or stale: a restart or another worker may have a fresher copy on disk
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None and stored[0] < ttl:
+                age, value = stored
+                with self._lock:
+                    self._insert(key, value, time.monotonic() - age)
+                    self.hits += 1
+                    self.store_hits += 1
+                return value
+        
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.stale += 1
+        return None
+    
+    def peek(self, key: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """Fresh in-memory entry or None, without touching the counters"""
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+        return None
+    
+    def get_stale(self, key: str) -> Optional[Dict]:
+        """Last stored value regardless of age, without touching the counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+        if self.store is not None:
+            stored = self.store.get(key)
+            return stored[1] if stored is not None else None
+        return None
+    
+    def _insert(self, key: str, value: Dict, stored_at: float):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def put(self, key: str, value: Dict):
+        with self._lock:
+            self._insert(key, value, time.monotonic())
+        if self.store is not None:
+            self.store.put(key, value)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "lookups": lookups,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "capacity": self.max_entries
+            }
+
+# Latency Instrumentation
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with interpolated percentiles"""
+    # Upper bucket bounds in seconds, 1 us to 30 s; the last bucket is +Inf
+    BOUNDS = [0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+              0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+    RATE_SLOTS = 60  # per-second counters backing rate(); longest window it can report
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Ring of per-second counters keyed by int(monotonic()) for the fetch rate
+        self.second_counts = [0] * self.RATE_SLOTS
+        self.second_keys = [-1] * self.RATE_SLOTS
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            second = int(time.monotonic())
+            slot = second % self.RATE_SLOTS
+            if self.second_keys[slot] != second:
+                self.second_keys[slot] = second
+                self.second_counts[slot] = 0
+            self.second_counts[slot] += 1
+    
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q / 100 * self.count
+            seen = 0
+            for i, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = self.BOUNDS[i - 1] if i > 0 else 0.0
+                    upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                    return lower + (upper - lower) * (rank - seen) / bucket_count
+                seen += bucket_count
+            return self.max
+    
+    def rate(self, window: float = 60.0) -> float:
+        """Observations per second over the last `window` seconds (at most RATE_SLOTS)"""
+        window = min(window, self.RATE_SLOTS)
+        now = int(time.monotonic())
+        with self._lock:
+            recent = sum(count for key, count in zip(self.second_keys, self.second_counts)
+                         if now - window < key <= now)
+        return recent / window
+
+class MarketMetrics:
+    """Latency histograms per fetch path: cache hits, primary, fallback and each source"""
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, path: str, seconds: float):
+        histogram = self.histograms.get(path)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(path, LatencyHistogram())
+        histogram.observe(seconds)
+    
+    def summary(self) -> List[Dict]:
+        rows = []
+        for path, histogram in sorted(self.histograms.items()):
+            def ms(q):
+                value = histogram.percentile(q)
+                return round(value * 1000, 3) if value is not None else None
+            rows.append({
+                "Path": path,
+                "Count": histogram.count,
+                "p50 (ms)": ms(50),
+                "p95 (ms)": ms(95),
+                "p99 (ms)": ms(99),
+                "Rate (/s, 1 min)": round(histogram.rate(), 2)
+            })
+        return rows
+    
+    def to_prometheus(self, cache_stats: Optional[Dict] = None) -> str:
+        lines = [
+            "# HELP market_fetch_latency_seconds Latency of market data fetch paths",
+            "# TYPE market_fetch_latency_seconds histogram"
+        ]
+        for path, histogram in sorted(self.histograms.items()):
+            label = path.replace("\\", "\\\\").replace('"', '\\"')
+            with histogram._lock:
+                counts, total, count = list(histogram.counts), histogram.total, histogram.count
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.BOUNDS + [float("inf")], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'market_fetch_latency_seconds_bucket{{path="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'market_fetch_latency_seconds_sum{{path="{label}"}} {total:.9f}')
+            lines.append(f'market_fetch_latency_seconds_count{{path="{label}"}} {count}')
+        if cache_stats:
+            for name in ("hits", "store_hits", "misses", "stale", "evictions"):
+                lines.append(f"# TYPE market_cache_{name}_total counter")
+                lines.append(f"market_cache_{name}_total {cache_stats[name]}")
+        return "\n".join(lines) + "\n"
+    
+    def export(self, path: str, cache_stats: Optional[Dict] = None) -> str:
+        """Write the text exposition atomically so a collector never reads half a file"""
+        text = self.to_prometheus(cache_stats)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+        return text
+
+# Request Coalescing
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight execution"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key: str, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+# Per-Symbol Tick Storage
+class TickRing:
+    """Preallocated ring buffer of (timestamp, price, volume) ticks for one symbol"""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.zeros(capacity, dtype=np.float64)
+        self.head = 0  # next write position
+        self.count = 0
+    
+    def append(self, timestamp: float, price: float, volume: float):
+        self.timestamps[self.head] = timestamp
+        self.prices[self.head] = price
+        self.volumes[self.head] = volume
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def window(self, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Chronological copies of the stored ticks, optionally from `since` onward"""
+        if self.count < self.capacity:
+            order = slice(0, self.count)
+            timestamps, prices, volumes = self.timestamps[order], self.prices[order], self.volumes[order]
+        else:
+            timestamps = np.concatenate((self.timestamps[self.head:], self.timestamps[:self.head]))
+            prices = np.concatenate((self.prices[self.head:], self.prices[:self.head]))
+            volumes = np.concatenate((self.volumes[self.head:], self.volumes[:self.head]))
+        if since is not None:
+            start = np.searchsorted(timestamps, since)
+            timestamps, prices, volumes = timestamps[start:], prices[start:], volumes[start:]
+        return timestamps.copy(), prices.copy(), volumes.copy()
+
+class TickStore:
+    """Fixed memory per symbol: one TickRing each, created on first tick"""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.rings: Dict[str, TickRing] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, symbol: str, timestamp: float, price: float, volume: float):
+        with self._lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                ring = self.rings[symbol] = TickRing(self.capacity)
+            ring.append(timestamp, price, volume)
+    
+    def window(self, symbol: str, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        with self._lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                empty = np.zeros(0)
+                return empty, empty, empty
+            return ring.window(since)
+    
+    def __len__(self) -> int:
+        return len(self.rings)
+
+def downsample_min_max(timestamps: np.ndarray, prices: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the low and high of each bucket so spikes survive downsampling"""
+    n = len(prices)
+    if n <= max_points:
+        return timestamps, prices
+    buckets = max(max_points // 2, 1)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = prices
+    rows = padded.reshape(buckets, size)
+    # The last bucket may be partly padding; every bucket has at least one real tick
+    rows = rows[~np.all(np.isnan(rows), axis=1)]
+    offsets = np.arange(len(rows)) * size
+    keep = np.unique(np.concatenate((offsets + np.nanargmin(rows, axis=1), offsets + np.nanargmax(rows, axis=1))))
+    return timestamps[keep], prices[keep]
+
+# Tick Recording and Replay
+class TickRecorder:
+    """Append-only columnar recording: one raw little-endian file per column per day.
+    
+    `<dir>/<YYYY-MM-DD>/` holds timestamp.f8, price.f8, volume.f8 and symbol.i4,
+    plus symbols.txt mapping symbol ids (line numbers) to tickers. Ticks are
+    buffered and flushed in batches; after a crash readers cut every column
+    to the shortest one, and reopening the day truncates the files to match
+    before anything new is appended.
+    """
+    COLUMNS = {"timestamp": "<f8", "price": "<f8", "volume": "<f8", "symbol": "<i4"}
+    
+    def __init__(self, directory: str, flush_every: int = 1024, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self._day = None
+        self._symbol_ids: Dict[str, int] = {}
+        self._buffer = {name: [] for name in self.COLUMNS}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def _open_day(self, day: str):
+        self._day = day
+        path = os.path.join(self.directory, day)
+        os.makedirs(path, exist_ok=True)
+        symbols_path = os.path.join(path, "symbols.txt")
+        self._symbol_ids = {}
+        if os.path.exists(symbols_path):
+            with open(symbols_path) as f:
+                self._symbol_ids = {line.strip(): i for i, line in enumerate(f) if line.strip()}
+        # A crash between column writes leaves the files uneven; appending to them as they
+        # are would misalign every later row, so cut them back to the last complete row
+        sizes = {}
+        for name, dtype in self.COLUMNS.items():
+            file_path = os.path.join(path, f"{name}.{dtype[1:]}")
+            sizes[file_path] = (os.path.getsize(file_path) if os.path.exists(file_path) else 0, np.dtype(dtype).itemsize)
+        rows = min(size // itemsize for size, itemsize in sizes.values())
+        for file_path, (size, itemsize) in sizes.items():
+            if size > rows * itemsize:
+                os.truncate(file_path, rows * itemsize)
+    
+    def append(self, symbol: str, timestamp: float, price: float, volume: float):
+        day = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+        with self._lock:
+            if day != self._day:
+                self._flush_locked()
+                self._open_day(day)
+            symbol_id = self._symbol_ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = self._symbol_ids[symbol] = len(self._symbol_ids)
+                with open(os.path.join(self.directory, day, "symbols.txt"), "a") as f:
+                    f.write(symbol + "\n")
+            self._buffer["timestamp"].append(timestamp)
+            self._buffer["price"].append(price)
+            self._buffer["volume"].append(volume)
+            self._buffer["symbol"].append(symbol_id)
+            self.recorded += 1
+            if (len(self._buffer["timestamp"]) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+    
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if self._day is None or not self._buffer["timestamp"]:
+            return
+        path = os.path.join(self.directory, self._day)
+        for name, dtype in self.COLUMNS.items():
+            with open(os.path.join(path, f"{name}.{dtype[1:]}"), "ab") as f:
+                np.asarray(self._buffer[name], dtype=dtype).tofile(f)
+            self._buffer[name] = []
+    
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+def list_recordings(directory: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(day for day in os.listdir(directory) if os.path.exists(os.path.join(directory, day, "symbols.txt")))
+
+def load_recording(path: str) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """Symbols and memory-mapped columns of one recorded day, in timestamp order"""
+    with open(os.path.join(path, "symbols.txt")) as f:
+        symbols = [line.strip() for line in f if line.strip()]
+    columns = {}
+    for name, dtype in TickRecorder.COLUMNS.items():
+        file_path = os.path.join(path, f"{name}.{dtype[1:]}")
+        columns[name] = np.memmap(file_path, dtype=dtype, mode="r") if os.path.getsize(file_path) else np.zeros(0, dtype)
+    length = min(len(column) for column in columns.values())
+    columns = {name: column[:length] for name, column in columns.items()}
+    # Concurrent fetch threads can append slightly out of order; a stable sort keeps replays deterministic
+    if length and np.any(np.diff(columns["timestamp"]) < 0):
+        order = np.argsort(columns["timestamp"], kind="stable")
+        columns = {name: column[order] for name, column in columns.items()}
+    return symbols, columns
+
+class TickReplay:
+    """Feeds a recorded day through a tick pipeline (a TickPipeline or a LiveMarketDataRAG).
+    
+    `speed` is a multiple of real time (1, 10, ...); None replays as fast as the
+    pipeline can absorb ticks. run() replays on the calling thread, start() on a
+    background thread so a chart can follow `clock` while the day plays back.
+    """
+    def __init__(self, pipeline: "TickPipeline", path: str, speed: Optional[float] = None):
+        self.pipeline = pipeline
+        self.path = path
+        self.speed = speed
+        self.symbols, self.columns = load_recording(path)
+        self.total = len(self.columns["timestamp"])
+        self.replayed = 0
+        self.clock: Optional[float] = None  # recorded timestamp of the last replayed tick
+        self.report: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> "TickReplay":
+        self._thread = threading.Thread(target=self.run, name="tick-replay", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+    
+    def run(self) -> Dict:
+        timestamps = self.columns["timestamp"].tolist()
+        prices = self.columns["price"].tolist()
+        volumes = self.columns["volume"].tolist()
+        symbol_ids = self.columns["symbol"].tolist()
+        
+        max_lag = 0.0
+        started = time.perf_counter()
+        for i, timestamp in enumerate(timestamps):
+            if self.speed:
+                due = (timestamp - timestamps[0]) / self.speed
+                ahead = due - (time.perf_counter() - started)
+                if ahead > 0:
+                    self._stop.wait(ahead)
+                else:
+                    max_lag = max(max_lag, -ahead)
+            if self._stop.is_set():
+                break
+            self.pipeline.ingest_tick(self.symbols[symbol_ids[i]], timestamp, prices[i], volumes[i])
+            self.clock = timestamp
+            self.replayed = i + 1
+        elapsed = time.perf_counter() - started
+        self.report = {
+            "ticks": self.replayed,
+            "symbols": len(self.symbols),
+            "recorded_span_s": round(self.clock - timestamps[0], 1) if self.replayed else 0.0,
+            "replay_seconds": round(elapsed, 3),
+            "ticks_per_second": round(self.replayed / elapsed) if elapsed else 0,
+            "max_lag_ms": round(max_lag * 1000, 1)
+        }
+        return self.report
+
+def replay_recording(pipeline: "TickPipeline", path: str, speed: Optional[float] = None) -> Dict:
+    """Replay a recorded day on the calling thread; see TickReplay"""
+    return TickReplay(pipeline, path, speed).run()
+
+def write_synthetic_recording(directory: str, ticks: int = 1_000_000, symbols: int = 500,
+                              day: str = "2025-09-24") -> str:
+    """A deterministic random-walk trading day, for offline benchmarks"""
+    rng = np.random.default_rng(24)
+    path = os.path.join(directory, day)
+    os.makedirs(path, exist_ok=True)
+    names = list(mock_universe(symbols))
+    with open(os.path.join(path, "symbols.txt"), "w") as f:
+        f.write("\n".join(names) + "\n")
+    session_open = datetime.strptime(f"{day} 09:30", "%Y-%m-%d %H:%M").timestamp()
+    symbol_ids = rng.integers(0, len(names), ticks).astype("<i4")
+    timestamps = np.sort(session_open + rng.uniform(0, 6.5 * 3600, ticks))
+    base = np.array([reference_price(name) for name in names])
+    prices = base[symbol_ids] * (1 + rng.normal(0, 0.002, ticks))
+    columns = {"timestamp": timestamps, "price": prices,
+               "volume": rng.integers(100, 10000, ticks).astype(float), "symbol": symbol_ids}
+    for name, dtype in TickRecorder.COLUMNS.items():
+        np.asarray(columns[name], dtype=dtype).tofile(os.path.join(path, f"{name}.{dtype[1:]}"))
+    return path
+
+# Incremental Technical Indicators
+class SymbolIndicators:
+    """SMA, EMA, RSI, VWAP and Bollinger bands for one symbol, updated in O(1) per tick"""
+    def __init__(self, sma_window: int = 20, ema_window: int = 12, rsi_window: int = 14,
+                 bollinger_window: int = 20, bollinger_k: float = 2.0):
+        self.sma_window = sma_window
+        self.ema_window = ema_window
+        self.rsi_window = rsi_window
+        self.bollinger_window = bollinger_window
+        self.bollinger_k = bollinger_k
+        
+        # Shared price ring sized for the longest sliding window
+        self._ring_size = max(sma_window, bollinger_window)
+        self._ring = [0.0] * self._ring_size
+        self._head = 0
+        self.count = 0
+        self._sma_sum = 0.0
+        self._bb_sum = 0.0
+        self._bb_sumsq = 0.0
+        
+        self._ema_alpha = 2.0 / (ema_window + 1)
+        self.ema = None
+        
+        self._last_price = None
+        self._rsi_changes = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        
+        self._vwap_day = None
+        self._cum_pv = 0.0
+        self._cum_volume = 0.0
+    
+    def update(self, timestamp: float, price: float, volume: float):
+        # Sliding sums: read the price leaving each window before overwriting the slot
+        if self.count >= self.sma_window:
+            self._sma_sum -= self._ring[(self._head - self.sma_window) % self._ring_size]
+        if self.count >= self.bollinger_window:
+            leaving = self._ring[(self._head - self.bollinger_window) % self._ring_size]
+            self._bb_sum -= leaving
+            self._bb_sumsq -= leaving * leaving
+        self._ring[self._head] = price
+        self._head = (self._head + 1) % self._ring_size
+        self.count += 1
+        self._sma_sum += price
+        self._bb_sum += price
+        self._bb_sumsq += price * price
+        
+        self.ema = price if self.ema is None else self.ema + self._ema_alpha * (price - self.ema)
+        
+        # Wilder's RSI: simple average over the first window, smoothed afterwards
+        if self._last_price is not None:
+            change = price - self._last_price
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            self._rsi_changes += 1
+            n = min(self._rsi_changes, self.rsi_window)
+            self._avg_gain += (gain - self._avg_gain) / n
+            self._avg_loss += (loss - self._avg_loss) / n
+        self._last_price = price
+        
+        # VWAP resets with each trading day
+        day = int(timestamp // 86400)
+        if day != self._vwap_day:
+            self._vwap_day = day
+            self._cum_pv = 0.0
+            self._cum_volume = 0.0
+        self._cum_pv += price * volume
+        self._cum_volume += volume
+    
+    def values(self) -> Dict[str, Optional[float]]:
+        sma = self._sma_sum / self.sma_window if self.count >= self.sma_window else None
+        
+        rsi = None
+        if self._rsi_changes >= self.rsi_window:
+            rsi = 100.0 if self._avg_loss == 0 else 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+        
+        bb_mid = bb_upper = bb_lower = None
+        if self.count >= self.bollinger_window:
+            bb_mid = self._bb_sum / self.bollinger_window
+            variance = max(self._bb_sumsq / self.bollinger_window - bb_mid * bb_mid, 0.0)
+            band = self.bollinger_k * variance ** 0.5
+            bb_upper, bb_lower = bb_mid + band, bb_mid - band
+        
+        return {
+            "sma": sma,
+            "ema": self.ema,
+            "rsi": rsi,
+            "vwap": self._cum_pv / self._cum_volume if self._cum_volume else None,
+            "bb_upper": bb_upper,
+            "bb_mid": bb_mid,
+            "bb_lower": bb_lower
+        }
+
+class IndicatorEngine:
+    """Per-symbol indicator state with configurable windows"""
+    def __init__(self, **default_windows):
+        self.default_windows = default_windows
+        self.windows: Dict[str, Dict] = {}
+        self.symbols: Dict[str, SymbolIndicators] = {}
+        self._lock = threading.Lock()
+    
+    def configure(self, symbol: str, **windows):
+        """Set a symbol's windows; its indicator state restarts empty"""
+        with self._lock:
+            self.windows[symbol] = {**self.default_windows, **windows}
+            self.symbols[symbol] = SymbolIndicators(**self.windows[symbol])
+    
+    def update(self, symbol: str, timestamp: float, price: float, volume: float):
+        with self._lock:
+            indicators = self.symbols.get(symbol)
+            if indicators is None:
+                indicators = self.symbols[symbol] = SymbolIndicators(**self.windows.get(symbol, self.default_windows))
+            indicators.update(timestamp, price, volume)
+    
+    def values(self, symbol: str) -> Optional[Dict[str, Optional[float]]]:
+        with self._lock:
+            indicators = self.symbols.get(symbol)
+            return indicators.values() if indicators is not None else None
+
+class TickPipeline:
+    """Tick store plus indicators: everything a chart needs, without the fetch machinery"""
+    def __init__(self, tick_capacity: int):
+        self.ticks = TickStore(tick_capacity)
+        self.indicators = IndicatorEngine()
+    
+    def ingest_tick(self, symbol: str, timestamp: float, price: float, volume: float):
+        self.ticks.record(symbol, timestamp, price, volume)
+        self.indicators.update(symbol, timestamp, price, volume)
+    
+    def configure_indicators(self, symbol: str, **windows):
+        """Change a symbol's indicator windows and rebuild them from its stored ticks"""
+        self.indicators.configure(symbol, **windows)
+        timestamps, prices, volumes = self.ticks.window(symbol)
+        for timestamp, price, volume in zip(timestamps.tolist(), prices.tolist(), volumes.tolist()):
+            self.indicators.update(symbol, timestamp, price, volume)
+
+# Adaptive Source Router
+class SourceRouter:
+    """Orders sources by expected latency and trips a circuit breaker on failing ones"""
+    def __init__(self, sources: List[str], alpha: float, failure_threshold: int, cooldown: float,
+                 default_delay: float, window: int = 200):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_delay = default_delay
+        self.window = window
+        self._lock = threading.RLock()
+        self.health = {}
+        for source in sources:
+            self._state(source)
+    
+    def _state(self, source: str) -> Dict:
+        if source not in self.health:
+            self.health[source] = {
+                "ewma_latency": None,
+                "ewma_error": 0.0,
+                "latencies": deque(maxlen=self.window),
+                "consecutive_failures": 0,
+                "open_until": 0.0
+            }
+        return self.health[source]
+    
+    def record(self, source: str, latency: float, success: bool):
+        with self._lock:
+            state = self._state(source)
+            error = 0.0 if success else 1.0
+            state["ewma_error"] += self.alpha * (error - state["ewma_error"])
+            if success:
+                if state["ewma_latency"] is None:
+                    state["ewma_latency"] = latency
+                else:
+                    state["ewma_latency"] += self.alpha * (latency - state["ewma_latency"])
+                state["latencies"].append(latency)
+                state["consecutive_failures"] = 0
+                state["open_until"] = 0.0
+            else:
+                state["consecutive_failures"] += 1
+                if state["consecutive_failures"] >= self.failure_threshold:
+                    state["open_until"] = time.monotonic() + self.cooldown
+    
+    def is_available(self, source: str) -> bool:
+        """Closed breaker, or open breaker whose cooldown has elapsed (half-open probe)"""
+        with self._lock:
+            return time.monotonic() >= self._state(source)["open_until"]
+    
+    def expected_latency(self, source: str) -> float:
+        """Expected time to a good answer; unmeasured sources rank first so they get sampled"""
+        with self._lock:
+            state = self._state(source)
+            latency, error = state["ewma_latency"], state["ewma_error"]
+        if latency is None:
+            if error == 0.0:
+                return 0.0
+            latency = self.default_delay
+        return latency / max(1.0 - error, 0.05)
+    
+    def hedge_delay(self, source: str) -> float:
+        """How long to wait on `source` before hedging: its recent p95 latency"""
+        with self._lock:
+            latencies = list(self._state(source)["latencies"])
+        if len(latencies) < 5:
+            return self.default_delay
+        return float(np.percentile(latencies, 95))
+    
+    def ranked(self, sources: List[str]) -> List[str]:
+        available = [source for source in sources if self.is_available(source)]
+        # If every breaker is open, try them all rather than failing outright
+        return sorted(available or sources, key=self.expected_latency)
+    
+    def snapshot(self) -> List[Dict]:
+        rows = []
+        with self._lock:
+            for source, state in self.health.items():
+                rows.append({
+                    "Source": source,
+                    "EWMA Latency (ms)": round(state["ewma_latency"] * 1000, 1) if state["ewma_latency"] is not None else None,
+                    "p95 (ms)": round(self.hedge_delay(source) * 1000, 1),
+                    "Error Rate": round(state["ewma_error"], 3),
+                    "Circuit": "closed" if self.is_available(source) else "open"
+                })
+        return rows
 
 # Live Market Data Class with Fallback Mechanism
 class LiveMarketDataRAG:
-    def __init__(self):
-        self.config = AdaptiveRAGConfig()
-        self.cache = {}
-        self.last_update = {}
+    def __init__(self, config: Optional[AdaptiveRAGConfig] = None):
+        self.config = config or AdaptiveRAGConfig()
+        store = None
+        if self.config.persistent_cache:
+            store = PersistentQuoteStore(self.config.cache_db_path, self.config.cache_db_retention)
+        self.cache = MarketDataCache(self.config.cache_duration, self.config.cache_max_entries, store)
+        self.catalogue = SymbolCatalogue.load(self.config.symbol_catalogue_path)
         self.data_quality_scores = {}
+        self.pipeline = TickPipeline(self.config.tick_capacity)
+        self.ticks = self.pipeline.ticks
+        self.indicators = self.pipeline.indicators
+        self.inflight = SingleFlight()
+        self.metrics = MarketMetrics()
+        self.recorder = TickRecorder(self.config.recording_dir) if self.config.record_ticks else None
+        self._stats_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.config.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.config.max_workers, thread_name_prefix="market-fetch")
+        # Separate pool for per-source requests so hedges never queue behind symbol fetches
+        self.source_executor = ThreadPoolExecutor(max_workers=self.config.max_workers * len(self.config.primary_sources),
+                                                  thread_name_prefix="market-source")
+        self.router = SourceRouter(self.config.primary_sources, self.config.ewma_alpha,
+                                   self.config.breaker_failure_threshold, self.config.breaker_cooldown,
+                                   self.config.hedge_default_delay)
         
     def get_cache_key(self, symbol: str, data_type: str) -> str:
         return f"{symbol}_{data_type}_{datetime.now().date()}"
     
     def is_cache_valid(self, key: str) -> bool:
-        if key not in self.last_update:
-            return False
-        return (datetime.now() - self.last_update[key]).seconds < self.config.cache_duration
+        age = self.cache.age(key)
+        return age is not None and age < self.config.cache_duration
     
     def update_quality_score(self, source: str, success: bool):
-        if source not in self.data_quality_scores:
-            self.data_quality_scores[source] = {"success": 0, "total": 0}
-        
-        self.data_quality_scores[source]["total"] += 1
-        if success:
-            self.data_quality_scores[source]["success"] += 1
+        with self._stats_lock:
+            if source not in self.data_quality_scores:
+                self.data_quality_scores[source] = {"success": 0, "total": 0}
+            
+            self.data_quality_scores[source]["total"] += 1
+            if success:
+                self.data_quality_scores[source]["success"] += 1
     
     def get_source_reliability(self, source: str) -> float:
-        if source not in self.data_quality_scores:
-            return 0.5
-        stats = self.data_quality_scores[source]
-        return stats["success"] / stats["total"] if stats["total"] > 0 else 0.5
+        with self._stats_lock:
+            if source not in self.data_quality_scores:
+                return 0.5
+            stats = self.data_quality_scores[source]
+            return stats["success"] / stats["total"] if stats["total"] > 0 else 0.5
+    
+    def quality_snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Consistent copy of the per-source counters for rendering"""
+        with self._stats_lock:
+            return {source: dict(stats) for source, stats in self.data_quality_scores.items()}
+    
+    def parse_quote(self, symbol: str, payload: Dict, source: str) -> Optional[Dict]:
+        """Normalize a source's JSON quote into the dashboard's quote dict"""
+        price = payload.get("price", payload.get("c"))
+        if price is None:
+            return None
+        price = float(price)
+        change = float(payload.get("change", payload.get("d", 0.0)) or 0.0)
+        previous = price - change
+        change_percent = payload.get("change_percent", payload.get("dp"))
+        if change_percent is None:
+            change_percent = (change / previous) * 100 if previous else 0.0
+        
+        data = {
+            "symbol": symbol,
+            "price": round(price, 2),
+            "change": round(change, 2),
+            "change_percent": round(float(change_percent), 2),
+            "volume": int(payload.get("volume", payload.get("v", 0)) or 0),
+            "timestamp": datetime.now().isoformat(),
+            "source": source
+        }
+        for field, alias in (("high", "h"), ("low", "l"), ("open", "o")):
+            value = payload.get(field, payload.get(alias))
+            if value is not None:
+                data[field] = round(float(value), 2)
+        return data
+    
+    def fetch_source_data(self, source: str, symbol: str) -> Optional[Dict]:
+        """Query a single primary source, retrying up to `retry_attempts` times"""
+        timeout = self.config.source_timeouts.get(source, self.config.timeout)
+        for attempt in range(self.config.retry_attempts):
+            started = time.perf_counter()
+            try:
+                response = self.session.get(source, params={"symbol": symbol}, timeout=timeout)
+                if response.status_code == 200:
+                    data = self.parse_quote(symbol, response.json(), source)
+                    if data is not None:
+                        self.metrics.observe(f"source:{source}", time.perf_counter() - started)
+                        self.router.record(source, time.perf_counter() - started, True)
+                        self.update_quality_score(source, True)
+                        return data
+                elif response.status_code == 404:
+                    # Unknown symbol: retrying will not help
+                    self.router.record(source, time.perf_counter() - started, True)
+                    self.update_quality_score(source, True)
+                    return None
+            except (requests.RequestException, ValueError):
+                pass
+            
+            self.metrics.observe(f"source:{source}", time.perf_counter() - started)
+            self.router.record(source, time.perf_counter() - started, False)
+            self.update_quality_score(source, False)
+            if attempt + 1 < self.config.retry_attempts and self.router.is_available(source):
+                time.sleep(self.config.retry_backoff * (2 ** attempt))
+            else:
+                break
+        return None
+    
+    def fetch_hedged_data(self, symbol: str) -> Optional[Dict]:
+        """Ask the fastest-expected source first, hedging to the next one at its p95"""
+        remaining = self.router.ranked(self.config.primary_sources)
+        pending = {}
+        
+        def launch():
+            source = remaining.pop(0)
+            pending[self.source_executor.submit(self.fetch_source_data, source, symbol)] = source
+            return source
+        
+        last_source = launch()
+        while pending:
+            delay = self.router.hedge_delay(last_source) if remaining else None
+            done, _ = wait(list(pending), timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # No answer by the source's p95: fire a hedged request at the next source
+                last_source = launch()
+                continue
+            for future in done:
+                pending.pop(future)
+                data = future.result()
+                if data is not None:
+                    # Slower duplicates finish in the background and only update stats
+                    return data
+            if remaining and not pending:
+                last_source = launch()
+        return None
     
     def fetch_primary_data(self, symbol: str) -> Optional[Dict]:
         """Primary data source with API fallback"""
+        if not self.config.simulate_sources:
+            if self.config.adaptive_routing:
+                return self.fetch_hedged_data(symbol)
+            for source in self.config.primary_sources:
+                data = self.fetch_source_data(source, symbol)
+                if data is not None:
+                    return data
+            return None
+        
         try:
             # Simulate real API calls with mock data based on actual market conditions
             # In production, replace with actual API calls
             
-            # Mock data based on recent market conditions (Sept 24, 2025)
-            base_prices = {
-                "SPY": 666.92,  # S&P 500 ETF
-                "QQQ": 575.73,  # NASDAQ ETF  
-                "DIA": 463.15,  # DOW ETF
-                "NVDA": 145.25, # NVIDIA
-                "AAPL": 184.50, # Apple
-                "MSFT": 425.75, # Microsoft
-                "GOOGL": 168.25, # Google
-                "TSLA": 267.88, # Tesla
-                "META": 495.67, # Meta
-                "AMZN": 187.45  # Amazon
-            }
-            
-            if symbol not in base_prices:
+            if symbol not in self.catalogue:
                 return None
             
             # Simulate realistic market fluctuations
-            base_price = base_prices[symbol]
+            base_price = self.catalogue.price(symbol)
             current_price = base_price * (1 + random.uniform(-0.02, 0.02))
             change = current_price - base_price
             change_percent = (change / base_price) * 100
@@ -148,29 +1165,61 @@ class LiveMarketDataRAG:
             self.update_quality_score("fallback_scraper", False)
             return None
     
-    def get_live_data(self, symbol: str) -> Dict:
-        """Main method with adaptive fallback mechanism"""
+    def get_live_data(self, symbol: str, notify: bool = True, max_age: Optional[float] = None,
+                      count_lookup: bool = True) -> Dict:
+        """Main method with adaptive fallback mechanism.
+        
+        Background refreshes pass count_lookup=False so the cache hit rate only
+        reflects on-demand lookups.
+        """
         cache_key = self.get_cache_key(symbol, "live_price")
         
         # Check cache first
-        if self.is_cache_valid(cache_key) and cache_key in self.cache:
-            return self.cache[cache_key]
+        started = time.perf_counter()
+        if count_lookup:
+            cached = self.cache.get(cache_key, max_age)
+        else:
+            cached = self.cache.peek(cache_key, max_age)
+        if cached is not None:
+            self.metrics.observe("cache_hit", time.perf_counter() - started)
+            return cached
+        
+        # Concurrent sessions asking for the same symbol share one upstream fetch
+        data, notices = self.inflight.do(cache_key, self._fetch_live_data, symbol, cache_key, max_age)
+        if notify:
+            for level, message in notices:
+                getattr(st, level)(message)
+        return data
+    
+    def _fetch_live_data(self, symbol: str, cache_key: str, max_age: Optional[float]) -> Tuple[Dict, List[Tuple[str, str]]]:
+        """Upstream fetch with fallbacks; returns the quote and UI notices for the callers"""
+        notices = []
+        
+        # A flight that just finished may have filled the cache after our lookup
+        cached = self.cache.peek(cache_key, max_age)
+        if cached is not None:
+            return cached, notices
         
         # Try primary data source
+        started = time.perf_counter()
         data = self.fetch_primary_data(symbol)
+        self.metrics.observe("primary", time.perf_counter() - started)
         
         # If primary fails, try fallback
         if data is None:
-            st.warning(f"Primary source failed for {symbol}, using fallback...")
+            notices.append(("warning", f"Primary source failed for {symbol}, using fallback..."))
+            started = time.perf_counter()
             data = self.fetch_fallback_data(symbol)
+            self.metrics.observe("fallback", time.perf_counter() - started)
         
         # If all fails, use cached data or mock data
         if data is None:
-            if cache_key in self.cache:
-                st.info(f"Using cached data for {symbol}")
-                return self.cache[cache_key]
+            stale_data = self.cache.get_stale(cache_key)
+            if stale_data is not None:
+                notices.append(("info", f"Using cached data for {symbol}"))
+                return stale_data, notices
             else:
-                st.error(f"No data available for {symbol}, using mock data")
+                notices.append(("error", f"No data available for {symbol}, using mock data"))
                 data = {
                     "symbol": symbol,
                     "price": 100.0,
@@ -182,16 +1231,195 @@ class LiveMarketDataRAG:
                 }
         
         # Cache the result
-        self.cache[cache_key] = data
-        self.last_update[cache_key] = datetime.now()
+        self.cache.put(cache_key, data)
+        if data["source"] != "mock_data":
+            self.ingest_quote(data)
         
-        return data
+        return data, notices
+    
+    def ingest_quote(self, data: Dict):
+        """Feed a fresh quote into the tick store, the indicator engine and any recording"""
+        timestamp = datetime.fromisoformat(data["timestamp"]).timestamp()
+        volume = data.get("volume", 0)
+        self.ingest_tick(data["symbol"], timestamp, data["price"], volume)
+        if self.recorder is not None:
+            self.recorder.append(data["symbol"], timestamp, data["price"], volume)
+    
+    def ingest_tick(self, symbol: str, timestamp: float, price: float, volume: float):
+        self.pipeline.ingest_tick(symbol, timestamp, price, volume)
+    
+    def set_recording(self, enabled: bool):
+        if enabled and self.recorder is None:
+            self.recorder = TickRecorder(self.config.recording_dir)
+        elif not enabled and self.recorder is not None:
+            self.recorder.flush()
+            self.recorder = None
+    
+    def configure_indicators(self, symbol: str, **windows):
+        self.pipeline.configure_indicators(symbol, **windows)
+    
+    def iter_live_data_many(self, symbols: Iterable[str], timeout: Optional[float] = None,
+                            max_age: Optional[float] = None,
+                            count_lookup: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """Fetch symbols concurrently, yielding (symbol, data) as each one completes.
+        
+        Stops at `timeout` seconds with whatever has arrived; fetches still in
+        flight keep running on the pool and land in the cache for the next call.
+        """
+        futures = {
+            self.executor.submit(self.get_live_data, symbol, False, max_age, count_lookup): symbol
+            for symbol in dict.fromkeys(symbols)
+        }
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                yield futures[future], future.result()
+        except FuturesTimeoutError:
+            return
+    
+    def get_live_data_many(self, symbols: Iterable[str], timeout: Optional[float] = None,
+                           max_age: Optional[float] = None) -> Dict[str, Dict]:
+        """Concurrent multi-symbol fetch; partial results if `timeout` expires"""
+        return dict(self.iter_live_data_many(symbols, timeout, max_age))
+
+# Shared Background Poller
+class MarketPoller:
+    """One fetch per interval for the union of symbols watched by all sessions"""
+    def __init__(self, rag: LiveMarketDataRAG, interval: float):
+        self.rag = rag
+        self.interval = interval
+        self.watch_ttl = interval * 3  # sessions that stop refreshing drop out
+        self.latest: Dict[str, Dict] = {}
+        self.polls = 0
+        self.last_poll = None
+        self._last_export = 0.0
+        self._watchers: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="market-poller", daemon=True)
+    
+    def start(self) -> "MarketPoller":
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+    
+    def watch(self, session_id: str, symbols: Iterable[str]):
+        with self._lock:
+            self._watchers[session_id] = (time.monotonic(), tuple(symbols))
+    
+    def watched_symbols(self) -> List[str]:
+        cutoff = time.monotonic() - self.watch_ttl
+        with self._lock:
+            self._watchers = {sid: w for sid, w in self._watchers.items() if w[0] >= cutoff}
+            return list(dict.fromkeys(sym for _, symbols in self._watchers.values() for sym in symbols))
+    
+    def poll_once(self):
+        symbols = self.watched_symbols()
+        if not symbols:
+            return
+        for symbol, data in self.rag.iter_live_data_many(symbols, timeout=self.interval, max_age=self.interval,
+                                                          count_lookup=False):
+            self.latest[symbol] = data
+        self.polls += 1
+        self.last_poll = datetime.now()
+        
+        config = self.rag.config
+        if config.metrics_export_interval and time.monotonic() - self._last_export >= config.metrics_export_interval:
+            self.rag.metrics.export(config.metrics_export_path, self.rag.cache.stats())
+            self._last_export = time.monotonic()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception:
+                # Keep polling; a bad cycle only delays the next snapshot
+                pass
 
 # Initialize the RAG system
 @st.cache_resource
 def get_market_rag():
     return LiveMarketDataRAG()
 
+@st.cache_resource
+def get_market_poller():
+    market_rag = get_market_rag()
+    return MarketPoller(market_rag, market_rag.config.refresh_interval).start()
+
+# Live panels: re-rendered on a timer as fragments, reading the shared poller
+def render_live_quotes(poller: MarketPoller, session_id: str, symbols: List[str]):
+    poller.watch(session_id, symbols)
+    if not symbols:
+        st.info("Add symbols to the watchlist to stream live quotes.")
+        return
+    columns = st.columns(min(len(symbols), 5))
+    for i, watch_symbol in enumerate(symbols):
+        quote = poller.latest.get(watch_symbol)
+        with columns[i % len(columns)]:
+            if quote is None:
+                st.metric(watch_symbol, "…", help="Waiting for the next poll")
+            else:
+                st.metric(watch_symbol, f"${quote['price']:,.2f}", f"{quote['change_percent']:+.2f}%")
+    if poller.last_poll is not None:
+        st.caption(f"Last poll: {poller.last_poll.strftime('%H:%M:%S')} · {poller.polls} polls shared across sessions")
+
+def render_tick_chart(market_rag: LiveMarketDataRAG, symbol: str, replay: Optional[TickReplay] = None):
+    """Intraday chart and indicators; with a replay, its pipeline on the recorded clock"""
+    if replay is not None:
+        market_rag = replay.pipeline
+        state = "Replaying" if replay.running else "Replayed"
+        clock = datetime.fromtimestamp(replay.clock).strftime("%Y-%m-%d %H:%M:%S") if replay.clock else "-"
+        st.caption(f"⏪ {state} {os.path.basename(replay.path)} at "
+                   f"{f'{replay.speed:g}×' if replay.speed else 'max speed'} · "
+                   f"{replay.replayed:,}/{replay.total:,} ticks · recorded clock {clock}")
+    chart_windows = {"Last 15 min": 15 * 60, "Last hour": 60 * 60, "Last 6 hours": 6 * 60 * 60, "All ticks": None}
+    chart_window = st.radio("Chart Window", list(chart_windows), horizontal=True)
+    window_seconds = chart_windows[chart_window]
+    now = replay.clock if replay is not None and replay.clock else time.time()
+    since = now - window_seconds if window_seconds else None
+    tick_times, tick_prices, _ = market_rag.ticks.window(symbol, since)
+
+    if len(tick_prices) == 0:
+        if replay is not None:
+            st.info(f"No replayed ticks for {symbol} yet.")
+        else:
+            st.info(f"No ticks recorded for {symbol} yet - fetch live data to start the intraday chart.")
+    else:
+        chart_times, chart_prices = downsample_min_max(tick_times, tick_prices, max_points=600)
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=pd.to_datetime(chart_times, unit="s"), y=chart_prices, mode='lines',
+                                 name=symbol, line=dict(color='#4ecdc4', width=2)))
+        fig.update_layout(
+            title=f"{symbol} Intraday Chart ({len(tick_prices):,} ticks, {len(chart_prices):,} plotted)",
+            xaxis_title="Time",
+            yaxis_title="Price",
+            template="plotly_dark",
+            height=400
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    indicator_values = market_rag.indicators.values(symbol)
+    if indicator_values is None:
+        st.info(f"Indicators for {symbol} start with its first recorded tick.")
+    else:
+        def fmt(value, pattern="${:,.2f}"):
+            return pattern.format(value) if value is not None else "warming up"
+
+        ind_col1, ind_col2, ind_col3, ind_col4, ind_col5 = st.columns(5)
+        with ind_col1:
+            st.metric("SMA", fmt(indicator_values["sma"]))
+        with ind_col2:
+            st.metric("EMA", fmt(indicator_values["ema"]))
+        with ind_col3:
+            st.metric("RSI", fmt(indicator_values["rsi"], "{:.1f}"))
+        with ind_col4:
+            st.metric("VWAP", fmt(indicator_values["vwap"]))
+        with ind_col5:
+            st.metric("Bollinger", fmt(indicator_values["bb_mid"]),
+                      f"±{indicator_values['bb_upper'] - indicator_values['bb_mid']:.2f}" if indicator_values["bb_mid"] is not None else None,
+                      delta_color="off")
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -250,231 +1478,723 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Main App
-st.markdown('<h1 class="main-header">📈 Adaptive RAG Live Market Data</h1>', unsafe_allow_html=True)
-st.markdown('<div class="live-indicator">🔴 LIVE - September 24, 2025</div>', unsafe_allow_html=True)
-
-# Initialize RAG system
-market_rag = get_market_rag()
-
-# Sidebar Configuration
-st.sidebar.title("🎛️ RAG Configuration")
-st.sidebar.markdown("### Data Source Status")
-
-# Display source reliability
-for source, score in market_rag.data_quality_scores.items():
-    reliability = market_rag.get_source_reliability(source)
-    color = "🟢" if reliability > 0.8 else "🟡" if reliability > 0.5 else "🔴"
-    st.sidebar.markdown(f"{color} **{source}**: {reliability:.1%}")
-
-st.sidebar.markdown("---")
-st.sidebar.markdown("### Fallback Strategy")
-st.sidebar.markdown("""
-1. **Primary APIs** (Real-time)
-2. **Fallback Scrapers** (5min delay)  
-3. **Cached Data** (Last valid)
-4. **Mock Data** (Emergency)
-""")
-
-# Auto-refresh toggle
-auto_refresh = st.sidebar.checkbox("🔄 Auto Refresh (30s)", value=True)
-if auto_refresh:
-    st.sidebar.markdown("*Next update in 30 seconds*")
-
-# Main Market Dashboard
-st.subheader("📊 Live Market Dashboard")
-
-# Current market data based on search results
-current_market_data = {
-    "S&P 500": {"value": 6668, "change": -0.39, "source": "Trading Economics"},
-    "NASDAQ": {"value": 22573.47, "change": -0.95, "source": "CNBC"},
-    "DOW": {"value": 46381.54, "change": 0.14, "source": "CNBC"}
-}
+def main():
+    st.markdown('<h1 class="main-header">📈 Adaptive RAG Live Market Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="live-indicator">🔴 LIVE - September 24, 2025</div>', unsafe_allow_html=True)
+
+    # Initialize RAG system
+    market_rag = get_market_rag()
+    poller = get_market_poller()
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+
+    # Sidebar Configuration
+    st.sidebar.title("🎛️ RAG Configuration")
+    st.sidebar.markdown("### Data Source Status")
+
+    # Display source reliability
+    quality_scores = market_rag.quality_snapshot()
+    for source in quality_scores:
+        reliability = market_rag.get_source_reliability(source)
+        color = "🟢" if reliability > 0.8 else "🟡" if reliability > 0.5 else "🔴"
+        st.sidebar.markdown(f"{color} **{source}**: {reliability:.1%}")
 
-# Display current market indices
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    st.markdown(f"""
-    <div class="metric-card">
-        <h3>📈 S&P 500</h3>
-        <h2>{current_market_data["S&P 500"]["value"]}</h2>
-        <p style="color: {'red' if current_market_data['S&P 500']['change'] < 0 else 'green'}">
-            {current_market_data["S&P 500"]["change"]:+.2f}%
-        </p>
-        <small>Source: {current_market_data["S&P 500"]["source"]}</small>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col2:
-    st.markdown(f"""
-    <div class="metric-card">
-        <h3>💻 NASDAQ</h3>
-        <h2>{current_market_data["NASDAQ"]["value"]}</h2>
-        <p style="color: {'red' if current_market_data['NASDAQ']['change'] < 0 else 'green'}">
-            {current_market_data["NASDAQ"]["change"]:+.2f}%
-        </p>
-        <small>Source: {current_market_data["NASDAQ"]["source"]}</small>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col3:
-    st.markdown(f"""
-    <div class="metric-card">
-        <h3>🏭 DOW JONES</h3>
-        <h2>{current_market_data["DOW"]["value"]}</h2>
-        <p style="color: {'red' if current_market_data['DOW']['change'] < 0 else 'green'}">
-            {current_market_data["DOW"]["change"]:+.2f}%
-        </p>
-        <small>Source: {current_market_data["DOW"]["source"]}</small>
-    </div>
-    """, unsafe_allow_html=True)
-
-# Live Stock Lookup
-st.subheader("🔍 Live Stock Lookup")
-col1, col2 = st.columns([3, 1])
-
-with col1:
-    symbol = st.selectbox("Select Stock Symbol", 
-                         ["SPY", "QQQ", "DIA", "NVDA", "AAPL", "MSFT", "GOOGL", "TSLA", "META", "AMZN"])
-
-with col2:
-    st.markdown("<br>", unsafe_allow_html=True)
-    if st.button("🔄 Get Live Data"):
-        with st.spinner("Fetching live data..."):
-            data = market_rag.get_live_data(symbol)
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### Fallback Strategy")
+    st.sidebar.markdown("""
+    1. **Primary APIs** (Real-time)
+    2. **Fallback Scrapers** (5min delay)  
+    3. **Cached Data** (Last valid)
+    4. **Mock Data** (Emergency)
+    """)
+
+    # Tick recording and offline replay
+    st.sidebar.markdown("---")
+    st.sidebar.markdown("### ⏺️ Recording & Replay")
+    # Recording is shared by every session: mirror its current state into the widget and
+    # only change it when this session actually toggles the checkbox
+    st.session_state.record_ticks = market_rag.recorder is not None
+    st.sidebar.checkbox("Record live ticks (all sessions)", key="record_ticks",
+                        on_change=lambda: market_rag.set_recording(st.session_state.record_ticks))
+    if market_rag.recorder is not None:
+        st.sidebar.caption(f"{market_rag.recorder.recorded:,} ticks recorded to {market_rag.config.recording_dir}/")
+    # A replay runs in its own session-scoped pipeline and takes over the chart until closed
+    replay = st.session_state.get("tick_replay")
+    recorded_days = list_recordings(market_rag.config.recording_dir)
+    if recorded_days:
+        replay_day = st.sidebar.selectbox("Recorded day", recorded_days[::-1])
+        replay_speeds = {"1× (real time)": 1.0, "10×": 10.0, "Max speed": None}
+        replay_speed = st.sidebar.radio("Replay speed", list(replay_speeds), horizontal=True)
+        if st.sidebar.button("▶️ Replay"):
+            if market_rag.recorder is not None:
+                market_rag.recorder.flush()
+            if replay is not None:
+                replay.stop()
+            replay = TickReplay(TickPipeline(market_rag.config.tick_capacity),
+                                os.path.join(market_rag.config.recording_dir, replay_day),
+                                replay_speeds[replay_speed]).start()
+            st.session_state.tick_replay = replay
+    if replay is not None:
+        if replay.report is not None:
+            st.sidebar.success(f"{replay.report['ticks']:,} ticks at {replay.report['ticks_per_second']:,} ticks/s")
+        if replay.running and st.sidebar.button("⏸️ Stop replay"):
+            replay.stop()
+        if st.sidebar.button("⏹️ Back to live data"):
+            replay.stop()
+            replay = st.session_state.tick_replay = None
+
+    # Auto-refresh toggle
+    refresh_interval = market_rag.config.refresh_interval
+    auto_refresh = st.sidebar.checkbox(f"🔄 Auto Refresh ({refresh_interval}s)", value=True)
+    if auto_refresh:
+        st.sidebar.markdown(f"*Live quotes and chart update every {refresh_interval} seconds*")
+    # Only the fragments re-run on the timer; the rest of the page stays put
+    run_every = refresh_interval if auto_refresh else None
+
+    # Main Market Dashboard
+    st.subheader("📊 Live Market Dashboard")
+
+    # Current market data based on search results
+    current_market_data = {
+        "S&P 500": {"value": 6668, "change": -0.39, "source": "Trading Economics"},
+        "NASDAQ": {"value": 22573.47, "change": -0.95, "source": "CNBC"},
+        "DOW": {"value": 46381.54, "change": 0.14, "source": "CNBC"}
+    }
+
+    # Display current market indices
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>📈 S&P 500</h3>
+            <h2>{current_market_data["S&P 500"]["value"]}</h2>
+            <p style="color: {'red' if current_market_data['S&P 500']['change'] < 0 else 'green'}">
+                {current_market_data["S&P 500"]["change"]:+.2f}%
+            </p>
+            <small>Source: {current_market_data["S&P 500"]["source"]}</small>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>💻 NASDAQ</h3>
+            <h2>{current_market_data["NASDAQ"]["value"]}</h2>
+            <p style="color: {'red' if current_market_data['NASDAQ']['change'] < 0 else 'green'}">
+                {current_market_data["NASDAQ"]["change"]:+.2f}%
+            </p>
+            <small>Source: {current_market_data["NASDAQ"]["source"]}</small>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>🏭 DOW JONES</h3>
+            <h2>{current_market_data["DOW"]["value"]}</h2>
+            <p style="color: {'red' if current_market_data['DOW']['change'] < 0 else 'green'}">
+                {current_market_data["DOW"]["change"]:+.2f}%
+            </p>
+            <small>Source: {current_market_data["DOW"]["source"]}</small>
+        </div>
+        """, unsafe_allow_html=True)
+
+    # Live Stock Lookup
+    st.subheader("🔍 Live Stock Lookup")
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        search_query = st.text_input("Search Symbol or Company",
+                                     placeholder=f"Type a ticker or name ({len(market_rag.catalogue):,} symbols)")
+        matches = market_rag.catalogue.search(search_query, limit=25) if search_query else []
+        if search_query and not matches:
+            st.caption("No matching symbols - showing popular tickers")
+        options = [row["symbol"] for row in matches] or list(BASE_PRICES)
+        symbol = st.selectbox("Select Stock Symbol", options,
+                              format_func=lambda s: f"{s} - {market_rag.catalogue.by_symbol[s]['name']}")
+
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🔄 Get Live Data"):
+            with st.spinner("Fetching live data..."):
+                data = market_rag.get_live_data(symbol)
             
-            if data:
-                col_a, col_b, col_c, col_d = st.columns(4)
+                if data:
+                    col_a, col_b, col_c, col_d = st.columns(4)
                 
-                with col_a:
-                    st.metric("Price", f"${data['price']}", f"{data['change']:+.2f}")
+                    with col_a:
+                        st.metric("Price", f"${data['price']}", f"{data['change']:+.2f}")
                 
-                with col_b:
-                    st.metric("Change %", f"{data['change_percent']:+.2f}%")
+                    with col_b:
+                        st.metric("Change %", f"{data['change_percent']:+.2f}%")
                 
-                with col_c:
-                    st.metric("Volume", f"{data['volume']:,}")
+                    with col_c:
+                        st.metric("Volume", f"{data['volume']:,}")
                 
-                with col_d:
-                    st.metric("Source", data['source'])
+                    with col_d:
+                        st.metric("Source", data['source'])
                 
-                # Display additional data if available
-                if 'high' in data and 'low' in data:
-                    col_e, col_f = st.columns(2)
-                    with col_e:
-                        st.metric("High", f"${data.get('high', 'N/A')}")
-                    with col_f:
-                        st.metric("Low", f"${data.get('low', 'N/A')}")
-
-# Market Insights from Search Results
-st.subheader("📰 Latest Market Insights")
-
-# Display insights from the search results
-market_insights = [
-    {
-        "title": "Recent Market Performance",
-        "content": "The S&P 500 fell to 6668 points on September 23, 2025, losing 0.39% from the previous session.",
-        "source": "Trading Economics",
-        "timestamp": "Sep 23, 2025"
-    },
-    {
-        "title": "Market Gains Over Time", 
-        "content": "Over the past month, the S&P 500 has climbed 3.55% and is up 16.31% compared to the same time last year.",
-        "source": "Trading Economics", 
-        "timestamp": "Sep 23, 2025"
-    },
-    {
-        "title": "AI Trade Concerns",
-        "content": "Questions remain on whether the AI trade can continue powering U.S. equities given the risks tied to elevated market valuations.",
-        "source": "CNBC",
-        "timestamp": "Sep 23, 2025"
-    },
-    {
-        "title": "Bank Forecasts",
-        "content": "Wells Fargo expects the S&P 500 to finish 2025 at 6,650, while Barclays raised its year-end price target to 6,450.",
-        "source": "CNBC",
-        "timestamp": "Sep 10, 2025"
-    }
-]
-
-for insight in market_insights:
-    with st.expander(f"📄 {insight['title']} - {insight['timestamp']}"):
-        st.write(insight['content'])
-        st.caption(f"Source: {insight['source']}")
-
-# RAG Performance Metrics
-st.subheader("🎯 RAG System Performance")
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    total_requests = sum([scores["total"] for scores in market_rag.data_quality_scores.values()])
-    st.metric("Total Requests", total_requests)
-
-with col2:
-    cache_hit_rate = len(market_rag.cache) / max(total_requests, 1) * 100
-    st.metric("Cache Hit Rate", f"{cache_hit_rate:.1f}%")
-
-with col3:
-    avg_reliability = np.mean([market_rag.get_source_reliability(source) 
-                              for source in market_rag.data_quality_scores.keys()]) if market_rag.data_quality_scores else 0
-    st.metric("Avg Source Reliability", f"{avg_reliability:.1%}")
-
-# Real-time Chart (Mock)
-st.subheader("📈 Real-time Price Chart")
-
-# Generate mock intraday data
-times = pd.date_range(start="2025-09-24 09:30", end="2025-09-24 16:00", freq="5min")
-prices = 6668 + np.cumsum(np.random.randn(len(times)) * 0.5)
-
-fig = go.Figure()
-fig.add_trace(go.Scatter(x=times, y=prices, mode='lines', name='S&P 500', line=dict(color='#4ecdc4', width=2)))
-fig.update_layout(
-    title="S&P 500 Intraday Chart - September 24, 2025",
-    xaxis_title="Time",
-    yaxis_title="Price",
-    template="plotly_dark",
-    height=400
-)
-st.plotly_chart(fig, use_container_width=True)
-
-# Data Quality Dashboard
-st.subheader("📊 Data Quality & Sources")
-
-if market_rag.data_quality_scores:
-    sources = list(market_rag.data_quality_scores.keys())
-    success_rates = [market_rag.get_source_reliability(source) for source in sources]
-    
-    fig = go.Figure(data=[
-        go.Bar(x=sources, y=success_rates, marker_color=['#4ecdc4', '#ff6b6b', '#f7b801', '#45b7d1'])
-    ])
-    fig.update_layout(
-        title="Data Source Reliability",
-        yaxis_title="Success Rate",
-        template="plotly_dark",
-        height=300
+                    # Display additional data if available
+                    if 'high' in data and 'low' in data:
+                        col_e, col_f = st.columns(2)
+                        with col_e:
+                            st.metric("High", f"${data.get('high', 'N/A')}")
+                        with col_f:
+                            st.metric("Low", f"${data.get('low', 'N/A')}")
+
+    # Watchlist with concurrent fetching
+    st.subheader("📋 Watchlist")
+    if "watchlist" not in st.session_state:
+        st.session_state.watchlist = ["SPY", "QQQ", "DIA"]
+    if st.button(f"➕ Add {symbol} to Watchlist") and symbol not in st.session_state.watchlist:
+        st.session_state.watchlist = st.session_state.watchlist + [symbol]
+    watchlist = st.multiselect("Watchlist Symbols", list(dict.fromkeys(list(BASE_PRICES) + st.session_state.watchlist)),
+                               key="watchlist")
+
+    st.fragment(run_every=run_every)(render_live_quotes)(poller, st.session_state.session_id, list(dict.fromkeys(watchlist + [symbol])))
+
+    if st.button("📥 Fetch Watchlist") and watchlist:
+        watchlist_table = st.empty()
+        rows = []
+        # Render rows as they arrive instead of waiting for the slowest symbol
+        for watch_symbol, watch_data in market_rag.iter_live_data_many(watchlist, timeout=market_rag.config.timeout):
+            rows.append({
+                "Symbol": watch_symbol,
+                "Price": watch_data["price"],
+                "Change %": watch_data["change_percent"],
+                "Volume": watch_data["volume"],
+                "Source": watch_data["source"]
+            })
+            watchlist_table.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        if len(rows) < len(watchlist):
+            st.warning(f"{len(watchlist) - len(rows)} symbol(s) did not respond in time")
+
+    # Market Insights from Search Results
+    st.subheader("📰 Latest Market Insights")
+
+    # Display insights from the search results
+    market_insights = [
+        {
+            "title": "Recent Market Performance",
+            "content": "The S&P 500 fell to 6668 points on September 23, 2025, losing 0.39% from the previous session.",
+            "source": "Trading Economics",
+            "timestamp": "Sep 23, 2025"
+        },
+        {
+            "title": "Market Gains Over Time", 
+            "content": "Over the past month, the S&P 500 has climbed 3.55% and is up 16.31% compared to the same time last year.",
+            "source": "Trading Economics", 
+            "timestamp": "Sep 23, 2025"
+        },
+        {
+            "title": "AI Trade Concerns",
+            "content": "Questions remain on whether the AI trade can continue powering U.S. equities given the risks tied to elevated market valuations.",
+            "source": "CNBC",
+            "timestamp": "Sep 23, 2025"
+        },
+        {
+            "title": "Bank Forecasts",
+            "content": "Wells Fargo expects the S&P 500 to finish 2025 at 6,650, while Barclays raised its year-end price target to 6,450.",
+            "source": "CNBC",
+            "timestamp": "Sep 10, 2025"
+        }
+    ]
+
+    for insight in market_insights:
+        with st.expander(f"📄 {insight['title']} - {insight['timestamp']}"):
+            st.write(insight['content'])
+            st.caption(f"Source: {insight['source']}")
+
+    # RAG Performance Metrics
+    st.subheader("🎯 RAG System Performance")
+
+    cache_stats = market_rag.cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        total_requests = sum([scores["total"] for scores in quality_scores.values()])
+        st.metric("Total Requests", total_requests)
+
+    with col2:
+        st.metric("Cache Hit Rate", f"{cache_stats['hit_rate'] * 100:.1f}%")
+
+    with col3:
+        st.metric("Cache Evictions", cache_stats["evictions"])
+
+    with col4:
+        avg_reliability = np.mean([market_rag.get_source_reliability(source) 
+                                  for source in quality_scores.keys()]) if quality_scores else 0
+        st.metric("Avg Source Reliability", f"{avg_reliability:.1%}")
+
+    st.caption(
+        f"Cache: {cache_stats['hits']} hits ({cache_stats['store_hits']} warm from disk) · {cache_stats['misses']} misses · "
+        f"{cache_stats['stale']} stale · {cache_stats['size']}/{cache_stats['capacity']} entries"
     )
-    st.plotly_chart(fig, use_container_width=True)
 
-# Auto-refresh mechanism
-if auto_refresh:
-    time.sleep(1)  # Small delay to prevent too frequent updates
-    st.rerun()
+    # Real-time Chart and indicators from recorded ticks
+    chart_rag, chart_symbol, chart_every = market_rag, symbol, run_every
+    if replay is not None:
+        # Replayed days carry their own symbols; follow the replay clock while it plays
+        chart_rag = replay.pipeline
+        chart_symbol = st.selectbox("Replayed Symbol", replay.symbols,
+                                    index=replay.symbols.index(symbol) if symbol in replay.symbols else 0)
+        chart_every = 1 if replay.running else run_every
+    st.subheader(f"📈 {'Replayed' if replay is not None else 'Real-time'} Price Chart & Indicators - {chart_symbol}")
+
+    with st.expander("Indicator Windows"):
+        current_windows = chart_rag.indicators.windows.get(chart_symbol, {})
+        win_col1, win_col2, win_col3, win_col4 = st.columns(4)
+        with win_col1:
+            sma_window = st.number_input("SMA", 2, 500, current_windows.get("sma_window", 20))
+        with win_col2:
+            ema_window = st.number_input("EMA", 2, 500, current_windows.get("ema_window", 12))
+        with win_col3:
+            rsi_window = st.number_input("RSI", 2, 500, current_windows.get("rsi_window", 14))
+        with win_col4:
+            bollinger_window = st.number_input("Bollinger", 2, 500, current_windows.get("bollinger_window", 20))
+        if st.button("Apply Windows"):
+            chart_rag.configure_indicators(chart_symbol, sma_window=sma_window, ema_window=ema_window,
+                                            rsi_window=rsi_window, bollinger_window=bollinger_window)
+
+    st.fragment(run_every=chart_every)(render_tick_chart)(market_rag, chart_symbol, replay)
+
+    # Data Quality Dashboard
+    st.subheader("📊 Data Quality & Sources")
+
+    if quality_scores:
+        sources = list(quality_scores.keys())
+        success_rates = [market_rag.get_source_reliability(source) for source in sources]
+    
+        fig = go.Figure(data=[
+            go.Bar(x=sources, y=success_rates, marker_color=['#4ecdc4', '#ff6b6b', '#f7b801', '#45b7d1'])
+        ])
+        fig.update_layout(
+            title="Data Source Reliability",
+            yaxis_title="Success Rate",
+            template="plotly_dark",
+            height=300
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    if not market_rag.config.simulate_sources:
+        st.markdown("#### 🧭 Adaptive Source Routing")
+        st.dataframe(pd.DataFrame(market_rag.router.snapshot()), use_container_width=True, hide_index=True)
+
+    st.markdown("#### ⏱️ Fetch Latency by Path")
+    latency_rows = market_rag.metrics.summary()
+    if latency_rows:
+        st.dataframe(pd.DataFrame(latency_rows), use_container_width=True, hide_index=True)
+        if st.button("💾 Export Metrics"):
+            metrics_path = market_rag.config.metrics_export_path
+            metrics_text = market_rag.metrics.export(metrics_path, market_rag.cache.stats())
+            st.success(f"Metrics written to {os.path.abspath(metrics_path)}")
+            st.download_button("📥 Download metrics", metrics_text, file_name=os.path.basename(metrics_path), mime="text/plain")
+    else:
+        st.info("Latency histograms fill in as quotes are fetched.")
+
+    # Footer
+    st.markdown("---")
+    st.markdown("### 🔧 System Status")
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.success("✅ Primary API: Online")
+
+    with col2:
+        st.info("🔄 Fallback: Ready")
+
+    with col3:
+        st.warning("⚡ Cache: Active")
+
+    st.caption("Last updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"))
+    st.caption("Adaptive RAG System - Intelligent fallback mechanisms ensure data availability")
+
+# Stand-in Market Data Server
+class MockExchangeServer:
+    """Local HTTP quote server with configurable latency, error rate and symbol universe.
+    
+    Each request waits `latency` plus up to `jitter` seconds (`slow_latency` for a
+    `slow_rate` fraction of requests) and fails with a 503 at `error_rate`. Prices
+    random-walk per symbol from their reference price. With `symbols` set, other
+    tickers get a 404; without it every ticker is served.
+    """
+    def __init__(self, latency: float = 0.02, error_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_latency: float = 0.5, port: int = 0, jitter: float = 0.0,
+                 symbols: Optional[Dict[str, float]] = None, host: str = "127.0.0.1"):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.symbols = symbols
+        self.requests = 0
+        self.errors = 0
+        self._prices: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        server = self
+        
+        class QuoteHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                symbol = query.get("symbol", [""])[0]
+                with server._lock:
+                    server.requests += 1
+                if random.random() < server.slow_rate:
+                    time.sleep(server.slow_latency)
+                else:
+                    time.sleep(server.latency + random.uniform(0, server.jitter))
+                
+                if random.random() < server.error_rate:
+                    with server._lock:
+                        server.errors += 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                quote = server.quote(symbol)
+                if quote is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps(quote).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        
+        self.httpd = ThreadingHTTPServer((host, port), QuoteHandler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}/quote"
+    
+    def quote(self, symbol: str) -> Optional[Dict]:
+        if self.symbols is not None and symbol not in self.symbols:
+            return None
+        base_price = self.symbols[symbol] if self.symbols is not None else reference_price(symbol)
+        with self._lock:
+            price = self._prices.get(symbol, base_price) * (1 + random.gauss(0, 0.001))
+            self._prices[symbol] = price
+        return {
+            "symbol": symbol,
+            "price": price,
+            "change": price - base_price,
+            "volume": random.randint(1000, 100000),
+            "high": max(price, base_price) * 1.005,
+            "low": min(price, base_price) * 0.995,
+            "open": base_price
+        }
+    
+    def start(self) -> "MockExchangeServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def latency_summary(samples: List[float]) -> Dict:
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
 
-# Footer
-st.markdown("---")
-st.markdown("### 🔧 System Status")
+def benchmark_hedging(requests_count: int = 300) -> Dict:
+    """Tail latency of get_live_data with fixed source order vs adaptive routing"""
+    # Listed first: usually quick, but one request in ten stalls for half a second
+    slow = MockExchangeServer(latency=0.01, slow_rate=0.1, slow_latency=0.5).start()
+    steady = MockExchangeServer(latency=0.03).start()
+    results = {}
+    try:
+        for mode, adaptive in (("fixed_order", False), ("adaptive_hedged", True)):
+            config = AdaptiveRAGConfig()
+            config.simulate_sources = False
+            config.adaptive_routing = adaptive
+            config.primary_sources = [slow.url, steady.url]
+            config.persistent_cache = False
+            rag = LiveMarketDataRAG(config)
+            samples = []
+            for i in range(requests_count):
+                started = time.perf_counter()
+                rag.get_live_data(f"BENCH{i}", notify=False)
+                samples.append(time.perf_counter() - started)
+            results[mode] = latency_summary(samples)
+    finally:
+        slow.stop()
+        steady.stop()
+    return results
 
-col1, col2, col3 = st.columns(3)
+def benchmark_indicators(symbols: int = 500, ticks: int = 200000) -> Dict:
+    """Sustained indicator updates per second over a random-walk tick stream"""
+    engine = IndicatorEngine()
+    rng = np.random.default_rng(7)
+    symbol_ids = rng.integers(0, symbols, ticks)
+    prices = (100 + np.cumsum(rng.normal(0, 0.05, ticks))).tolist()
+    volumes = rng.integers(100, 10000, ticks).astype(float).tolist()
+    names = [f"SYM{i}" for i in range(symbols)]
+    now = time.time()
+    
+    started = time.perf_counter()
+    for i, symbol_id in enumerate(symbol_ids.tolist()):
+        engine.update(names[symbol_id], now + i * 0.001, prices[i], volumes[i])
+    elapsed = time.perf_counter() - started
+    return {"symbols": symbols, "ticks": ticks, "seconds": round(elapsed, 3),
+            "ticks_per_second": round(ticks / elapsed), "us_per_tick": round(elapsed / ticks * 1e6, 2)}
 
-with col1:
-    st.success("✅ Primary API: Online")
+def stress_coalescing(threads: int = 64, symbols: int = 8, rounds: int = 20) -> Dict:
+    """Many sessions requesting the same symbols at once against a stand-in source"""
+    server = MockExchangeServer(latency=0.05).start()
+    config = AdaptiveRAGConfig()
+    config.simulate_sources = False
+    config.persistent_cache = False
+    config.primary_sources = [server.url]
+    config.max_workers = threads
+    rag = LiveMarketDataRAG(config)
+    barrier = threading.Barrier(threads)
+    errors = []
+    
+    def session(worker: int):
+        try:
+            for round_number in range(rounds):
+                barrier.wait()
+                for i in range(symbols):
+                    # Stagger the order so sessions collide on every symbol
+                    rag.get_live_data(f"R{round_number}S{(i + worker) % symbols}", notify=False)
+        except Exception as e:
+            errors.append(repr(e))
+    
+    workers = [threading.Thread(target=session, args=(worker,)) for worker in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    server.stop()
+    
+    cache_stats = rag.cache.stats()
+    recorded = sum(stats["total"] for stats in rag.quality_snapshot().values())
+    return {
+        "lookups": threads * symbols * rounds,
+        "cache_lookups_counted": cache_stats["lookups"],
+        "distinct_quotes": symbols * rounds,
+        "upstream_calls": server.requests,
+        "upstream_calls_recorded": recorded,
+        "coalesced": rag.inflight.coalesced,
+        "errors": len(errors),
+        "seconds": round(elapsed, 2)
+    }
+
+def mock_universe(size: int) -> Dict[str, float]:
+    """The known tickers plus synthetic ones up to `size` symbols"""
+    universe = dict(BASE_PRICES)
+    i = 0
+    while len(universe) < size:
+        symbol = f"SYM{i:04d}"
+        universe[symbol] = reference_price(symbol)
+        i += 1
+    return universe
+
+def run_load_test(sessions: int = 50, duration: float = 10.0, universe_size: int = 200,
+                  latency: float = 0.02, jitter: float = 0.02, error_rate: float = 0.02,
+                  source_count: int = 2, source_urls: Optional[List[str]] = None,
+                  cache_ttl: float = 5.0, think_time: float = 0.05, skew: float = 1.1) -> Dict:
+    """Drive LiveMarketDataRAG with concurrent simulated sessions against stand-in sources.
+    
+    Sessions pick symbols with a Zipf-like skew, so a few tickers are hot, as on
+    a real dashboard. Pass `source_urls` to target already running servers.
+    """
+    universe = mock_universe(universe_size)
+    servers = []
+    if not source_urls:
+        servers = [MockExchangeServer(latency=latency, jitter=jitter, error_rate=error_rate,
+                                      symbols=universe).start()
+                   for _ in range(source_count)]
+        source_urls = [server.url for server in servers]
+    
+    config = AdaptiveRAGConfig()
+    config.simulate_sources = False
+    config.persistent_cache = False
+    config.primary_sources = source_urls
+    config.cache_duration = cache_ttl
+    config.max_workers = max(sessions, config.max_workers)
+    rag = LiveMarketDataRAG(config)
+    
+    symbols = list(universe)
+    cum_weights = list(np.cumsum([1 / (rank + 1) ** skew for rank in range(len(symbols))]))
+    samples: List[List[float]] = [[] for _ in range(sessions)]
+    deadline = time.monotonic() + duration
+    
+    def session(index: int):
+        rng = random.Random(index)
+        while time.monotonic() < deadline:
+            symbol = rng.choices(symbols, cum_weights=cum_weights)[0]
+            started = time.perf_counter()
+            rag.get_live_data(symbol, notify=False)
+            samples[index].append(time.perf_counter() - started)
+            if think_time:
+                time.sleep(rng.uniform(0, 2 * think_time))
+    
+    workers = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    for server in servers:
+        server.stop()
+    
+    all_samples = [sample for session_samples in samples for sample in session_samples]
+    cache_stats = rag.cache.stats()
+    report = {
+        "sessions": sessions,
+        "seconds": round(elapsed, 2),
+        "requests": len(all_samples),
+        "throughput_rps": round(len(all_samples) / elapsed, 1),
+        "cache_hit_rate": round(cache_stats["hit_rate"], 3),
+        "coalesced": rag.inflight.coalesced,
+        "upstream_calls": sum(stats["total"] for stats in rag.quality_snapshot().values()),
+        "upstream_errors": sum(stats["total"] - stats["success"] for stats in rag.quality_snapshot().values()),
+        "fallback_fetches": next((row["Count"] for row in rag.metrics.summary() if row["Path"] == "fallback"), 0)
+    }
+    if all_samples:
+        report.update(latency_summary(all_samples))
+    return report
 
-with col2:
-    st.info("🔄 Fallback: Ready")
+def benchmark_symbol_search(size: int = 8000, queries: int = 20000) -> Dict:
+    """Type-ahead latency over a synthetic catalogue of `size` symbols"""
+    rng = random.Random(11)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    words = ["Global", "Holdings", "Energy", "Systems", "Bank", "Pharma", "Capital", "Networks",
+             "Foods", "Motors", "Realty", "Labs", "Industries", "Digital", "Partners"]
+    rows = {}
+    while len(rows) < size:
+        symbol = "".join(rng.choice(letters) for _ in range(rng.randint(1, 5)))
+        rows[symbol] = {"symbol": symbol, "name": f"{symbol.title()} {rng.choice(words)} {rng.choice(words)}",
+                        "exchange": "TEST", "reference_price": reference_price(symbol)}
+    
+    started = time.perf_counter()
+    catalogue = SymbolCatalogue(list(rows.values()))
+    build_seconds = time.perf_counter() - started
+    
+    prefixes = [symbol[:rng.randint(1, len(symbol))] for symbol in rng.choices(list(rows), k=queries // 2)]
+    prefixes += [rng.choice(words)[:rng.randint(2, 5)].lower() for _ in range(queries - len(prefixes))]
+    samples = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        catalogue.search(prefix, limit=25)
+        samples.append(time.perf_counter() - started)
+    summary = latency_summary(samples)
+    return {"symbols": size, "build_ms": round(build_seconds * 1000, 1),
+            "p50_us": round(summary["p50_ms"] * 1000, 1), "p99_us": round(summary["p99_ms"] * 1000, 1)}
 
-with col3:
-    st.warning("⚡ Cache: Active")
+def run_cli():
+    parser = argparse.ArgumentParser(description="Adaptive RAG market data tools (use `streamlit run` for the dashboard)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_hedging = commands.add_parser("bench-hedging", help="tail latency with a slow stand-in source")
+    bench_hedging.add_argument("--requests", type=int, default=300)
+    bench_indicators = commands.add_parser("bench-indicators", help="indicator update throughput")
+    bench_indicators.add_argument("--symbols", type=int, default=500)
+    bench_indicators.add_argument("--ticks", type=int, default=200000)
+    stress = commands.add_parser("stress", help="concurrent sessions on shared symbols")
+    stress.add_argument("--threads", type=int, default=64)
+    stress.add_argument("--symbols", type=int, default=8)
+    stress.add_argument("--rounds", type=int, default=20)
+    mock_server = commands.add_parser("mock-server", help="serve stand-in quotes over HTTP")
+    mock_server.add_argument("--host", default="127.0.0.1")
+    mock_server.add_argument("--port", type=int, default=8765)
+    mock_server.add_argument("--latency", type=float, default=0.02)
+    mock_server.add_argument("--jitter", type=float, default=0.02)
+    mock_server.add_argument("--error-rate", type=float, default=0.0)
+    mock_server.add_argument("--slow-rate", type=float, default=0.0)
+    mock_server.add_argument("--slow-latency", type=float, default=0.5)
+    mock_server.add_argument("--universe", type=int, default=0, help="symbol count; 0 serves any ticker")
+    loadtest = commands.add_parser("loadtest", help="concurrent simulated sessions against stand-in sources")
+    loadtest.add_argument("--sessions", type=int, default=50)
+    loadtest.add_argument("--duration", type=float, default=10.0)
+    loadtest.add_argument("--universe", type=int, default=200)
+    loadtest.add_argument("--latency", type=float, default=0.02)
+    loadtest.add_argument("--jitter", type=float, default=0.02)
+    loadtest.add_argument("--error-rate", type=float, default=0.02)
+    loadtest.add_argument("--sources", type=int, default=2, help="stand-in servers to start")
+    loadtest.add_argument("--source-url", action="append", help="use a running server instead (repeatable)")
+    loadtest.add_argument("--cache-ttl", type=float, default=5.0)
+    loadtest.add_argument("--think-time", type=float, default=0.05)
+    bench_search = commands.add_parser("bench-search", help="symbol type-ahead latency")
+    bench_search.add_argument("--symbols", type=int, default=8000)
+    replay = commands.add_parser("replay", help="replay a recorded day through the tick pipeline")
+    replay.add_argument("path", help="recording day directory, e.g. recordings/2025-09-24")
+    replay.add_argument("--speed", default="max", help="1, 10, ... times real time, or 'max'")
+    replay.add_argument("--symbol", help="print this symbol's price and indicators as the replay progresses")
+    replay.add_argument("--every", type=float, default=1.0, help="seconds between --symbol progress lines")
+    synth = commands.add_parser("synth-recording", help="write a synthetic recorded day for benchmarks")
+    synth.add_argument("--dir", default="recordings")
+    synth.add_argument("--ticks", type=int, default=1_000_000)
+    synth.add_argument("--symbols", type=int, default=500)
+    args = parser.parse_args()
+    
+    if args.command == "bench-hedging":
+        for mode, summary in benchmark_hedging(args.requests).items():
+            print(f"{mode:>16}: " + "  ".join(f"{k}={v}" for k, v in summary.items()))
+    elif args.command == "bench-indicators":
+        print("  ".join(f"{k}={v}" for k, v in benchmark_indicators(args.symbols, args.ticks).items()))
+    elif args.command == "stress":
+        result = stress_coalescing(args.threads, args.symbols, args.rounds)
+        print("  ".join(f"{k}={v}" for k, v in result.items()))
+        consistent = (result["upstream_calls"] == result["distinct_quotes"] == result["upstream_calls_recorded"]
+                      and result["cache_lookups_counted"] == result["lookups"] and not result["errors"])
+        print("OK: no duplicate upstream calls or lost updates" if consistent else "FAILED: counters disagree")
+        raise SystemExit(0 if consistent else 1)
+    elif args.command == "mock-server":
+        server = MockExchangeServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                    slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                                    symbols=mock_universe(args.universe) if args.universe else None,
+                                    host=args.host, port=args.port)
+        print(f"Serving stand-in quotes at {server.url}?symbol=SPY (Ctrl+C to stop)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    elif args.command == "loadtest":
+        report = run_load_test(args.sessions, args.duration, args.universe, args.latency, args.jitter,
+                               args.error_rate, args.sources, args.source_url, args.cache_ttl, args.think_time)
+        for key, value in report.items():
+            print(f"{key:>18}: {value}")
+    elif args.command == "bench-search":
+        print("  ".join(f"{k}={v}" for k, v in benchmark_symbol_search(args.symbols).items()))
+    elif args.command == "replay":
+        speed = None if args.speed == "max" else float(args.speed)
+        replay = TickReplay(TickPipeline(AdaptiveRAGConfig().tick_capacity), args.path, speed)
+        if args.symbol:
+            replay.start()
+            try:
+                while replay.running:
+                    time.sleep(args.every)
+                    _, prices, _ = replay.pipeline.ticks.window(args.symbol)
+                    values = replay.pipeline.indicators.values(args.symbol) or {}
+                    clock = datetime.fromtimestamp(replay.clock).strftime("%H:%M:%S") if replay.clock else "-"
+                    print(f"{clock}  {replay.replayed:,}/{replay.total:,} ticks  {args.symbol} "
+                          f"price={prices[-1] if len(prices) else None}  "
+                          + "  ".join(f"{k}={round(v, 4) if v is not None else None}" for k, v in values.items()))
+            except KeyboardInterrupt:
+                replay.stop()
+                replay._thread.join()
+            report = replay.report
+        else:
+            report = replay.run()
+        print("  ".join(f"{k}={v}" for k, v in report.items()))
+    elif args.command == "synth-recording":
+        print(write_synthetic_recording(args.dir, args.ticks, args.symbols))
 
-st.caption("Last updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC"))
-st.caption("Adaptive RAG System - Intelligent fallback mechanisms ensure data availability")
+if __name__ == "__main__":
+    if runtime.exists():
+        main()
+    else:
+        run_cli()
@@ -8,6 +8,18 @@ import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
+import threading
+from collections import deque
+import os
+import uuid
+import bisect
+import hashlib
+import logging
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
 
 # Configure page
 st.set_page_config(
@@ -17,74 +29,638 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Pluggable HTTP transport for the providers, selected with environment variables:
+#   CURRENCYCONV_HTTP_MODE       live (default) | record | replay
+#   CURRENCYCONV_FIXTURE_DIR     where record writes and replay reads responses (http_fixtures)
+#   CURRENCYCONV_REPLAY_LATENCY  seconds added to every replayed response
+#   CURRENCYCONV_REPLAY_FAILURES fraction of replayed requests that fail (0-1)
+#   CURRENCYCONV_REPLAY_SEED     seed for the injected failures, for repeatable runs (one sequence per URL)
+class HTTPTransport:
+    MODES = ('live', 'record', 'replay')
+    
+    def __init__(self, mode='live', fixture_dir='http_fixtures', latency=0.0, failure_rate=0.0, seed=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown HTTP mode {mode!r}; expected one of {', '.join(self.MODES)}")
+        self.mode = mode
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self.seed = seed
+        # Providers are fetched concurrently, so each URL draws from its own sequence
+        # to keep the failure pattern independent of thread timing
+        self._randoms = {}
+        self._lock = threading.Lock()
+        # One pooled session for all providers, so keep-alive connections are reused across refreshes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    @classmethod
+    def from_env(cls):
+        seed = os.environ.get("CURRENCYCONV_REPLAY_SEED")
+        return cls(
+            mode=os.environ.get("CURRENCYCONV_HTTP_MODE", "live").lower(),
+            fixture_dir=os.environ.get("CURRENCYCONV_FIXTURE_DIR", "http_fixtures"),
+            latency=float(os.environ.get("CURRENCYCONV_REPLAY_LATENCY", 0)),
+            failure_rate=float(os.environ.get("CURRENCYCONV_REPLAY_FAILURES", 0)),
+            seed=int(seed) if seed else None,
+        )
+    
+    def fixture_path(self, url):
+        digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+        return os.path.join(self.fixture_dir, f"{urlparse(url).netloc.replace(':', '_')}-{digest}.json")
+    
+    def get_json(self, url, timeout=10):
+        with self._lock:
+            self.requests += 1
+        try:
+            if self.mode == 'replay':
+                return self._replay(url)
+            response = self.session.get(url, timeout=timeout)
+            response.raise_for_status()
+            payload = response.json()
+            if self.mode == 'record':
+                os.makedirs(self.fixture_dir, exist_ok=True)
+                with open(self.fixture_path(url), "w") as f:
+                    json.dump({'url': url, 'recorded_at': datetime.now().isoformat(), 'body': payload}, f)
+            return payload
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+    
+    def _replay(self, url):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            rng = self._randoms.get(url)
+            if rng is None:
+                rng = self._randoms[url] = random.Random(f"{self.seed}:{url}" if self.seed is not None else None)
+            fail = rng.random() < self.failure_rate
+        if fail:
+            raise requests.ConnectionError(f"Injected failure for {url}")
+        try:
+            with open(self.fixture_path(url)) as f:
+                return json.load(f)['body']
+        except FileNotFoundError:
+            raise requests.ConnectionError(f"No recorded fixture for {url}") from None
+
+# A named cache region: one upstream loader with its own TTL. Concurrent readers of a
+# stale region share a single load, and manual refreshes are rate-limited per region.
+class CacheRegion:
+    def __init__(self, name, loader, ttl, min_refresh_interval=30):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.value = None
+        self.fetched_at = 0.0
+        self.loads = 0
+        self.coalesced = 0
+        self._expires = 0.0
+        self._last_manual = 0.0
+        self._inflight = None
+        self._lock = threading.Lock()
+    
+    def age(self):
+        return time.time() - self.fetched_at if self.fetched_at else None
+    
+    def get(self):
+        with self._lock:
+            if self.fetched_at and time.time() < self._expires:
+                return self.value
+            future = self._inflight
+            owner = future is None
+            if owner:
+                future = self._inflight = Future()
+            else:
+                self.coalesced += 1
+        if owner:
+            try:
+                value = self.loader()
+                with self._lock:
+                    self.value = value
+                    self.fetched_at = time.time()
+                    self._expires = self.fetched_at + self.ttl
+                    self.loads += 1
+                future.set_result(value)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight = None
+        return future.result()
+    
+    def invalidate(self):
+        """Expire the region; the next get() reloads, the old value stays for display until then"""
+        with self._lock:
+            self._expires = 0.0
+    
+    def request_refresh(self):
+        """Manual refresh: invalidate unless this region was refreshed too recently"""
+        with self._lock:
+            if time.time() - self._last_manual < self.min_refresh_interval:
+                return False
+            self._last_manual = time.time()
+            self._expires = 0.0
+            return True
+    
+    def retry_in(self):
+        return max(0.0, self.min_refresh_interval - (time.time() - self._last_manual))
+
 # Enhanced Live Market Data Class
 class EnhancedLiveMarketData:
     def __init__(self):
         self.cache_duration = 60
+        # Every provider is fetched concurrently; the page waits at most fetch_deadline seconds overall
+        self.fetch_deadline = 8
+        self.transport = HTTPTransport.from_env()
+        self.regions = {
+            'forex': CacheRegion('forex', self.fetch_enhanced_forex_rates, ttl=self.cache_duration),
+            'crypto': CacheRegion('crypto', self.fetch_enhanced_crypto_data, ttl=self.cache_duration),
+        }
+        self.providers = {name: region.get for name, region in self.regions.items()}
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="provider")
+        self.source_status = {}
+        self.recorded_at = {}
+        self._last_good = {}
+        self._lock = threading.Lock()
         
-    @st.cache_data(ttl=60)
-    def fetch_enhanced_forex_rates(_self):
-        try:
-            response = requests.get("https://api.exchangerate-api.com/v4/latest/USD", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                rates = data.get('rates', {})
-                
-                enhanced_data = {}
-                for currency, rate in rates.items():
-                    enhanced_data[currency] = {
-                        'rate': rate,
-                        'change_24h': random.uniform(-2, 2),
-                        'volatility': random.uniform(0.5, 2.0),
-                        'volume_24h': random.randint(50000000, 1500000000),
-                        'bid': rate * 0.9999,
-                        'ask': rate * 1.0001,
-                        'spread': rate * 0.0002,
-                        'last_update': datetime.now().strftime("%H:%M:%S")
-                    }
-                
-                return rates, data.get('date'), enhanced_data
-                
-        except Exception as e:
-            st.warning(f"API Error: {str(e)[:100]}...")
+    def fetch_enhanced_forex_rates(self):
+        data = self.transport.get_json("https://api.exchangerate-api.com/v4/latest/USD", timeout=10)
+        rates = data.get('rates', {})
         
-        return None, None, None
+        enhanced_data = {}
+        for currency, rate in rates.items():
+            enhanced_data[currency] = {
+                'rate': rate,
+                'bid': rate * 0.9999,
+                'ask': rate * 1.0001,
+                'spread': rate * 0.0002,
+                'last_update': datetime.now().strftime("%H:%M:%S")
+            }
+        
+        return rates, data.get('date'), enhanced_data
     
-    @st.cache_data(ttl=60)
-    def fetch_enhanced_crypto_data(_self):
-        try:
-            response = requests.get(
-                "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum,cardano,solana,dogecoin&vs_currencies=usd&include_24hr_change=true&include_24hr_vol=true&include_market_cap=true",
-                timeout=15
-            )
-            if response.status_code == 200:
-                data = response.json()
-                
-                enhanced_crypto = {}
-                for coin_id, coin_data in data.items():
-                    enhanced_crypto[coin_id] = {
-                        'price_usd': coin_data.get('usd', 0),
-                        'change_24h': coin_data.get('usd_24h_change', 0),
-                        'volume_24h': coin_data.get('usd_24h_vol', 0),
-                        'market_cap': coin_data.get('usd_market_cap', 0),
-                        'volatility': abs(coin_data.get('usd_24h_change', 0)) * 2,
-                        'fear_greed_index': random.randint(20, 80),
-                        'last_update': datetime.now().strftime("%H:%M:%S")
+    def fetch_enhanced_crypto_data(self):
+        data = self.transport.get_json(
+            "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum,cardano,solana,dogecoin&vs_currencies=usd&include_24hr_change=true&include_24hr_vol=true&include_market_cap=true",
+            timeout=15
+        )
+        
+        enhanced_crypto = {}
+        for coin_id, coin_data in data.items():
+            enhanced_crypto[coin_id] = {
+                'price_usd': coin_data.get('usd', 0),
+                'change_24h': coin_data.get('usd_24h_change', 0),
+                'volume_24h': coin_data.get('usd_24h_vol', 0),
+                'market_cap': coin_data.get('usd_market_cap', 0),
+                'volatility': abs(coin_data.get('usd_24h_change', 0)) * 2,
+                'fear_greed_index': random.randint(20, 80),
+                'last_update': datetime.now().strftime("%H:%M:%S")
+            }
+        
+        return enhanced_crypto
+    
+    def _record(self, name, future):
+        # Also runs as a done-callback, so a provider that misses the deadline still refreshes _last_good later;
+        # recording the same future twice is harmless
+        with self._lock:
+            error = future.exception()
+            if error is None:
+                fetched_at = self.regions[name].fetched_at if name in self.regions else time.time()
+                self._last_good[name] = (future.result(), fetched_at)
+                self.source_status[name] = {'state': 'live', 'fetched_at': fetched_at, 'error': None}
+            else:
+                self.source_status[name] = {
+                    'state': 'error',
+                    'fetched_at': self._last_good.get(name, (None, None))[1],
+                    'error': str(error)[:100]
+                }
+    
+    def fetch_all(self):
+        """Fetch every provider concurrently within one shared deadline.
+        
+        Returns {provider: payload}. Providers that fail or are still running
+        at the deadline fall back to their last good payload, or None.
+        """
+        futures = {}
+        for name, provider in self.providers.items():
+            future = self.executor.submit(provider)
+            future.add_done_callback(lambda f, name=name: self._record(name, f))
+            futures[name] = future
+        done, _ = wait(futures.values(), timeout=self.fetch_deadline)
+        # wait() can return before a finished future's callbacks have run, so record those
+        # here; the callback only matters for providers that finish after the deadline
+        for name, future in futures.items():
+            if future in done:
+                self._record(name, future)
+        
+        results = {}
+        with self._lock:
+            for name, future in futures.items():
+                if not future.done():
+                    self.source_status[name] = {
+                        'state': 'timeout',
+                        'fetched_at': self._last_good.get(name, (None, None))[1],
+                        'error': f"no response within {self.fetch_deadline}s"
                     }
-                
-                return enhanced_crypto
-                
-        except Exception as e:
-            st.warning(f"Crypto API Error: {str(e)[:100]}...")
+                results[name] = self._last_good.get(name, (None, None))[0]
+        return results
+    
+    def staleness_badges(self):
+        badges = []
+        with self._lock:
+            status = dict(self.source_status)
+        for name in self.providers:
+            info = status.get(name)
+            if info is None:
+                continue
+            age = time.time() - info['fetched_at'] if info['fetched_at'] else None
+            if info['state'] == 'live' and age is not None and age <= self.cache_duration * 2:
+                badges.append(f"🟢 {name} live ({age:.0f}s)")
+            elif age is not None:
+                badges.append(f"🟡 {name} stale ({age / 60:.0f}m, {info['state']})")
+            else:
+                badges.append(f"🔴 {name} unavailable ({info['state']})")
+        return badges
+
+# Rate history: one append-only float64 file per currency plus a shared timestamps file,
+# so a window query reads only the tail rows of the columns it needs
+RATE_HISTORY_DIR = "rate_history"
+# History replaces the provider's 24h figures only once it covers most of the day;
+# a change measured over a few snapshots is not a 24h move
+RATE_HISTORY_MIN_SPAN_H = 20
+
+class RateHistoryStore:
+    def __init__(self, directory=RATE_HISTORY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def _path(self, code):
+        return os.path.join(self.directory, f"{code}.f8")
+    
+    def _column(self, path):
+        if not os.path.exists(path) or os.path.getsize(path) < 8:
+            return np.zeros(0)
+        return np.memmap(path, dtype='<f8', mode='r')
+    
+    def __len__(self):
+        return self._column(self._path("_timestamps")).shape[0]
+    
+    def append(self, timestamp, rates):
+        """Append one snapshot row; codes missing from earlier rows are NaN-padded"""
+        with self._lock:
+            row = len(self)
+            for code, rate in rates.items():
+                path = self._path(code)
+                length = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+                if length > row:
+                    # Orphaned value from an append interrupted before its timestamp landed
+                    os.truncate(path, row * 8)
+                with open(path, "ab") as f:
+                    if length < row:
+                        np.full(row - length, np.nan).tofile(f)
+                    np.array([rate], dtype='<f8').tofile(f)
+            # Timestamps go last, so a crash mid-append leaves the row invisible to readers
+            # and the next append cuts the orphaned values back off
+            with open(self._path("_timestamps"), "ab") as f:
+                np.array([timestamp], dtype='<f8').tofile(f)
+    
+    def window(self, codes, seconds, now=None):
+        """Timestamps and a (rows x codes) rate matrix for the trailing window"""
+        timestamps = self._column(self._path("_timestamps"))
+        start = int(np.searchsorted(timestamps, (now or time.time()) - seconds))
+        return self._rows(codes, timestamps, start)
+    
+    def tail(self, codes, rows):
+        """Timestamps and rate matrix of the last `rows` snapshots"""
+        timestamps = self._column(self._path("_timestamps"))
+        return self._rows(codes, timestamps, max(0, timestamps.shape[0] - rows))
+    
+    def rows(self, codes, start, stop):
+        """Rate matrix of snapshot rows [start, stop), read without mapping whole columns"""
+        matrix = np.full((max(stop - start, 0), len(codes)), np.nan)
+        for j, code in enumerate(codes):
+            path = self._path(code)
+            available = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+            count = min(stop, available) - start
+            if count > 0:
+                matrix[:count, j] = np.fromfile(path, dtype='<f8', count=count, offset=start * 8)
+        return matrix
+    
+    def _rows(self, codes, timestamps, start):
+        rows = timestamps.shape[0]
+        matrix = np.full((rows - start, len(codes)), np.nan)
+        for j, code in enumerate(codes):
+            column = self._column(self._path(code))[start:rows]
+            matrix[:column.shape[0], j] = column
+        return np.array(timestamps[start:rows]), matrix
+    
+    def stats(self, codes, seconds=86400, now=None, min_span_h=0):
+        """Change and realized volatility over the window, in percent.
         
-        return None
+        Rates are units per USD, so change is the currency's move against the
+        dollar: (first / last - 1). Volatility is the root sum of squared log
+        returns. Codes with fewer than two samples in the window, or whose
+        samples span less than `min_span_h` hours, are omitted.
+        """
+        timestamps, matrix = self.window(codes, seconds, now)
+        if matrix.shape[0] < 2:
+            return {}
+        valid = ~np.isnan(matrix)
+        rows = np.arange(matrix.shape[0])[:, None]
+        first_idx = np.where(valid, rows, matrix.shape[0]).min(axis=0)
+        last_idx = np.where(valid, rows, -1).max(axis=0)
+        usable = (last_idx > first_idx) & (matrix.shape[0] > 0)
+        cols = np.arange(len(codes))
+        first = matrix[np.minimum(first_idx, matrix.shape[0] - 1), cols]
+        last = matrix[np.maximum(last_idx, 0), cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = (first / last - 1) * 100
+            returns = np.diff(np.log(matrix), axis=0)
+        volatility = np.sqrt(np.nansum(returns ** 2, axis=0)) * 100
+        span_h = (timestamps[np.maximum(last_idx, 0)] - timestamps[np.minimum(first_idx, len(timestamps) - 1)]) / 3600
+        return {
+            code: {'change_24h': float(change[j]), 'volatility': float(volatility[j]),
+                   'history_span_h': float(span_h[j])}
+            for j, code in enumerate(codes) if usable[j] and span_h[j] >= min_span_h
+        }
+
+# Rolling correlation of log returns over the stored rate history. Pairwise sums are kept
+# as k x k matrices (sum xy, sum x, sum x^2 and the count of rows where both are valid), so
+# each new snapshot costs O(k^2) instead of a pass over the whole window. Returns leaving
+# the window are read back from the store rather than kept in a ring buffer, so memory is
+# O(k^2) however long the window is (a year of snapshots for 200 codes would be ~0.8 GB).
+class RollingCorrelation:
+    CHUNK_ROWS = 8192
+    
+    def __init__(self, store, codes, window, min_periods=5):
+        self.store = store
+        self.codes = list(codes)
+        self.window = window
+        self.min_periods = min_periods
+        self._end = 0  # store rows covered; the window holds the returns of rows [_end - _filled, _end)
+        self._filled = 0
+        self._since_resum = 0
+        self._zero()
+    
+    def _zero(self):
+        k = len(self.codes)
+        self._sxy = np.zeros((k, k))
+        self._sx = np.zeros((k, k))
+        self._sxx = np.zeros((k, k))
+        self._n = np.zeros((k, k))
+    
+    def _returns(self, start, stop):
+        """Log returns of store rows [start, stop) against each row before them (start >= 1)"""
+        rates = self.store.rows(self.codes, start - 1, stop)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.diff(np.log(rates), axis=0)
+    
+    def _apply(self, returns, sign):
+        valid = ~np.isnan(returns)
+        if valid.all():
+            # Gap-free block: every pair shares every row, so one matrix product is enough
+            self._sxy += sign * (returns.T @ returns)
+            self._sx += sign * returns.sum(axis=0)[:, None]
+            self._sxx += sign * (returns * returns).sum(axis=0)[:, None]
+            self._n += sign * returns.shape[0]
+            return
+        rows = np.where(valid, returns, 0.0)
+        valid = valid.astype(float)
+        self._sxy += sign * (rows.T @ rows)
+        self._sx += sign * (rows.T @ valid)
+        self._sxx += sign * ((rows * rows).T @ valid)
+        self._n += sign * (valid.T @ valid)
+    
+    def _resum(self):
+        # Recomputing from the store now and then keeps add/subtract drift out of the sums;
+        # chunked, so a long window never has to be held in memory at once
+        self._zero()
+        for start in range(self._end - self._filled, self._end, self.CHUNK_ROWS):
+            self._apply(self._returns(start, min(start + self.CHUNK_ROWS, self._end)), 1)
+        self._since_resum = 0
+    
+    def seed(self):
+        """Cover the store's current tail in one pass"""
+        self._end = len(self.store)
+        self._filled = max(0, min(self.window, self._end - 1))
+        self._resum()
+    
+    def observe(self):
+        """Take in the row just appended to the store"""
+        if len(self.store) != self._end + 1:
+            # Rows were appended without being observed (or the store was reset): start over
+            self.seed()
+            return
+        if self._filled == self.window:
+            self._apply(self._returns(self._end - self.window, self._end - self.window + 1), -1)
+        else:
+            self._filled += 1
+        self._apply(self._returns(self._end, self._end + 1), 1)
+        self._end += 1
+        
+        self._since_resum += 1
+        if self._since_resum >= self.window:
+            self._resum()
+    
+    def matrix(self):
+        n, sx, sxx = self._n, self._sx, self._sxx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = n * self._sxy - sx * sx.T
+            var = (n * sxx - sx * sx) * (n * sxx.T - sx.T * sx.T)
+            corr = cov / np.sqrt(var)
+        corr[(n < self.min_periods) | ~(var > 0)] = np.nan
+        return np.clip(corr, -1, 1)
+
+# Windows in snapshots; at the 90s refresh, 350,400 snapshots is a year
+CORRELATION_WINDOWS = {'Last 60 snapshots': 60, 'Last 480 snapshots': 480, 'Last 2,880 snapshots': 2880,
+                       'Last 350,400 snapshots (~1 year)': 350_400}
+
+class CorrelationEngine:
+    def __init__(self, store, windows=CORRELATION_WINDOWS):
+        self.store = store
+        self.windows = windows
+        self.codes = []
+        self.models = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, codes):
+        """Take in the snapshot just appended to the store; a new code set reseeds from history"""
+        with self._lock:
+            if list(codes) != self.codes:
+                self.codes = list(codes)
+                self.models = {label: RollingCorrelation(self.store, codes, window) for label, window in self.windows.items()}
+                for model in self.models.values():
+                    model.seed()
+                return
+            for model in self.models.values():
+                model.observe()
+    
+    def matrix(self, label):
+        with self._lock:
+            model = self.models.get(label)
+            return (list(self.codes), model.matrix()) if model else ([], np.zeros((0, 0)))
+
+# Threshold-indexed alerts. Rules live in sorted threshold lists per (metric, currency,
+# direction), so a snapshot bisects between each value's previous and new reading and
+# touches only the rules that were actually crossed. '*' rules apply to every currency,
+# and 'AAA/BBB' rules watch the cross rate (level only).
+class AlertEngine:
+    METRICS = {'rate': 'level', 'change_24h': '24h move', 'volatility': 'volatility'}
+    
+    def __init__(self, history=500):
+        self.rules = {}
+        self.history = deque(maxlen=history)
+        self.evaluations = 0
+        self.last_eval_ms = 0.0
+        self._next_id = 1
+        self._index = {}
+        self._pairs = set()
+        self._last = {}
+        self._lock = threading.Lock()
+    
+    def add_rule(self, metric, code, direction, threshold, owner='default', severity='warning'):
+        if metric not in self.METRICS or direction not in ('above', 'below'):
+            raise ValueError(f"Unsupported alert rule: {metric} {direction}")
+        with self._lock:
+            rule_id = self._next_id
+            self._next_id += 1
+            rule = {'id': rule_id, 'metric': metric, 'code': code, 'direction': direction,
+                    'threshold': float(threshold), 'owner': owner, 'severity': severity}
+            self.rules[rule_id] = rule
+            thresholds, ids = self._index.setdefault((metric, code, direction), ([], []))
+            position = bisect.bisect_right(thresholds, threshold)
+            thresholds.insert(position, float(threshold))
+            ids.insert(position, rule_id)
+            if '/' in code:
+                self._pairs.add(code)
+            
+            # A reading already past the threshold never crosses it again, so fire those now
+            if code == '*':
+                readings = [(c, v) for (m, c), v in self._last.items() if m == metric and '/' not in c]
+            else:
+                readings = [(code, self._last[(metric, code)])] if (metric, code) in self._last else []
+            now = time.time()
+            for reading_code, value in readings:
+                if value >= rule['threshold'] if direction == 'above' else value <= rule['threshold']:
+                    self.history.append({**rule, 'rule_code': code, 'time': now,
+                                         'code': reading_code, 'value': float(value)})
+            return rule_id
+    
+    def remove_rule(self, rule_id):
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is None:
+                return
+            thresholds, ids = self._index[(rule['metric'], rule['code'], rule['direction'])]
+            position = bisect.bisect_left(thresholds, rule['threshold'])
+            position += ids[position:].index(rule_id)
+            del thresholds[position], ids[position]
+    
+    def rules_for(self, owner):
+        with self._lock:
+            return [rule for rule in self.rules.values() if rule['owner'] == owner]
+    
+    def _crossed(self, key, previous, value):
+        entry = self._index.get(key)
+        if not entry:
+            return []
+        thresholds, ids = entry
+        if key[2] == 'above':
+            # previous < threshold <= value; on first sight, every threshold at or below value
+            lo = bisect.bisect_right(thresholds, previous) if previous is not None else 0
+            hi = bisect.bisect_right(thresholds, value)
+        else:
+            lo = bisect.bisect_left(thresholds, value)
+            hi = bisect.bisect_left(thresholds, previous) if previous is not None else len(thresholds)
+        return ids[lo:hi]
+    
+    def evaluate(self, frame, now=None):
+        """Fire rules crossed since the previous snapshot; returns the new history events"""
+        started = time.perf_counter()
+        now = now or time.time()
+        observations = []
+        for metric in self.METRICS:
+            observations.extend((metric, code, value) for code, value in zip(frame.codes, getattr(frame, metric)))
+        for pair in self._pairs:
+            base, quote = pair.split('/', 1)
+            if base in frame.index and quote in frame.index:
+                observations.append(('rate', pair, frame.rate[frame.index[quote]] / frame.rate[frame.index[base]]))
+        
+        with self._lock:
+            fired = {}
+            for metric, code, value in observations:
+                if np.isnan(value):
+                    continue
+                previous = self._last.get((metric, code))
+                self._last[(metric, code)] = value
+                if previous == value:
+                    continue
+                for direction in ('above', 'below'):
+                    for target in (code, '*') if '/' not in code else (code,):
+                        for rule_id in self._crossed((metric, target, direction), previous, value):
+                            rule = self.rules[rule_id]
+                            # Crossing 2.5 implies crossing 1.5: keep only the furthest rule per owner
+                            key = (rule['owner'], code, metric, direction)
+                            best = fired.get(key)
+                            further = best is None or (rule['threshold'] > best[0]['threshold']
+                                                       if direction == 'above' else rule['threshold'] < best[0]['threshold'])
+                            if further:
+                                fired[key] = (rule, value)
+            events = [{**rule, 'rule_code': rule['code'], 'time': now, 'code': code, 'value': float(value)}
+                      for (_, code, _, _), (rule, value) in fired.items()]
+            self.history.extend(events)
+            self.evaluations += 1
+            self.last_eval_ms = (time.perf_counter() - started) * 1000
+        return events
+    
+    def events_for(self, owner, limit=50, since=None):
+        with self._lock:
+            events = [event for event in reversed(self.history)
+                      if event['owner'] in ('default', owner) and (since is None or event['time'] >= since)]
+        return events[:limit]
+    
+    @staticmethod
+    def describe(event):
+        emoji = "🚨" if event['severity'] == 'critical' else "⚠️"
+        if event['metric'] == 'change_24h' and event['owner'] == 'default':
+            return f"{emoji} {event['code']} moved {event['value']:+.2f}% in 24h"
+        unit = "%" if event['metric'] != 'rate' else ""
+        return (f"{emoji} {event['code']} {AlertEngine.METRICS[event['metric']]} {event['value']:.4g}{unit} "
+                f"crossed {event['direction']} {event['threshold']:g}{unit}")
 
 # Initialize market data
 @st.cache_resource
 def get_market_data_instance():
     return EnhancedLiveMarketData()
 
+@st.cache_resource
+def get_rate_history():
+    return RateHistoryStore()
+
+@st.cache_resource
+def get_correlation_engine():
+    return CorrelationEngine(get_rate_history())
+
+@st.cache_resource
+def get_alert_engine():
+    engine = AlertEngine()
+    # The classic dashboard alerts: every currency moving more than 1.5% / 2.5% in 24h
+    for threshold, severity in ((1.5, 'warning'), (2.5, 'critical')):
+        engine.add_rule('change_24h', '*', 'above', threshold, severity=severity)
+        engine.add_rule('change_24h', '*', 'below', -threshold, severity=severity)
+    return engine
+
 market_data = get_market_data_instance()
+rate_history = get_rate_history()
+correlation_engine = get_correlation_engine()
+alert_engine = get_alert_engine()
 
 # Enhanced CSS
 st.markdown("""
@@ -229,11 +805,96 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Cache for enhanced data
-@st.cache_data(ttl=120)
+# Columnar view of one snapshot: numeric columns as float arrays (NaN where a currency
+# has no value), so every derived panel is a vectorized pass instead of a dict walk
+class CurrencyFrame:
+    NUMERIC = ('rate', 'bid', 'ask', 'change_24h', 'volatility', 'volume_24h', 'market_cap', 'interest_rate')
+    
+    def __init__(self, currency_data):
+        self.codes = np.array(list(currency_data.keys()))
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.names = np.array([data.get('name', 'N/A') for data in currency_data.values()])
+        self.last_update = np.array([data.get('last_update', 'N/A') for data in currency_data.values()])
+        for column in self.NUMERIC:
+            setattr(self, column, np.array([data.get(column, np.nan) for data in currency_data.values()], dtype=float))
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def top(self, values, n, mask=None, largest=True):
+        """Codes of the n largest (or smallest) values, ties kept in snapshot order"""
+        candidates = ~np.isnan(values) if mask is None else mask & ~np.isnan(values)
+        idx = np.flatnonzero(candidates)
+        order = np.argsort(-values[idx] if largest else values[idx], kind='stable')
+        return self.codes[idx[order[:n]]].tolist()
+
+# Derived panels are computed once per snapshot and shared by every session
+@st.cache_data(max_entries=16)
+def compute_market_panels(snapshot_id, _frame):
+    frame = _frame
+    has_change = ~np.isnan(frame.change_24h)
+    not_usd = frame.codes != 'USD'
+    abs_change = np.abs(frame.change_24h)
+    high_yield = frame.top(frame.interest_rate, 1, mask=not_usd & (frame.interest_rate > 4))
+    low_vol = frame.top(frame.volatility, 1, mask=not_usd & (frame.volatility < 1), largest=False)
+    return {
+        'avg_change': float(frame.change_24h[has_change].mean()) if has_change.any() else 0.0,
+        'avg_volatility': float(np.where(np.isnan(frame.volatility), 1, frame.volatility).mean()),
+        'top_movers': frame.top(abs_change, 5),
+        'best_performer': (frame.top(frame.change_24h, 1, mask=not_usd) or [None])[0],
+        'worst_performer': (frame.top(frame.change_24h, 1, mask=not_usd, largest=False) or [None])[0],
+        'best_carry': high_yield[0] if high_yield else None,
+        'safest': low_vol[0] if low_vol else None,
+        'best_performers': frame.top(frame.change_24h, 3),
+        'worst_performers': frame.top(frame.change_24h, 3, largest=False),
+        'most_volatile': frame.top(frame.volatility, 3),
+        'market_table': market_table(frame),
+    }
+
+# Market overview columns stay numeric (Arrow-backed, missing values as nulls);
+# display formatting is left to MARKET_TABLE_COLUMNS so sorting is numeric, not lexical
+MARKET_TABLE_COLUMNS = {
+    'Rate (USD)': st.column_config.NumberColumn(format="%.6f"),
+    '24h Change': st.column_config.NumberColumn(format="%+.2f%%"),
+    'Volatility': st.column_config.NumberColumn(format="%.1f%%"),
+    'Volume 24h': st.column_config.NumberColumn(format="dollar", step=1),
+    'Market Cap': st.column_config.NumberColumn(format="dollar", step=1),
+    'Interest Rate': st.column_config.NumberColumn(format="%.2f%%"),
+}
+
+def market_table(frame):
+    numeric = {
+        'Rate (USD)': frame.rate,
+        '24h Change': frame.change_24h,
+        'Volatility': frame.volatility,
+        'Volume 24h': frame.volume_24h,
+        'Market Cap': frame.market_cap,
+        'Interest Rate': frame.interest_rate,
+    }
+    table = pd.DataFrame({
+        'Currency': pd.array(frame.codes, dtype="string[pyarrow]"),
+        'Name': pd.array(frame.names, dtype="string[pyarrow]"),
+        **{column: pd.array(np.where(np.isnan(values), None, values), dtype="float64[pyarrow]")
+           for column, values in numeric.items()},
+        'Last Update': pd.array(frame.last_update, dtype="string[pyarrow]"),
+    })
+    return table
+
+def filter_market_table(table, query="", min_move=0.0):
+    """Vectorized filter on code/name substring and absolute 24h move"""
+    mask = pd.Series(True, index=table.index)
+    if query:
+        mask &= (table['Currency'].str.contains(query, case=False, regex=False)
+                 | table['Name'].str.contains(query, case=False, regex=False)).fillna(False)
+    if min_move > 0:
+        mask &= (table['24h Change'].abs() >= min_move).fillna(False)
+    return table[mask]
+
+# Build one rates snapshot from whatever the providers returned
 def get_enhanced_currency_data():
-    live_rates, rate_date, enhanced_forex = market_data.fetch_enhanced_forex_rates()
-    crypto_data = market_data.fetch_enhanced_crypto_data()
+    provider_data = market_data.fetch_all()
+    live_rates, rate_date, enhanced_forex = provider_data['forex'] or (None, None, None)
+    crypto_data = provider_data['crypto']
     
     # Base currency data
     static_data = {
@@ -281,10 +942,119 @@ def get_enhanced_currency_data():
                     'last_update': crypto_data[coin_id]['last_update']
                 }
     
-    return static_data, rate_date
+    # Record provider rates not yet in the history (a region served from cache adds nothing),
+    # then derive change and volatility from real history
+    def is_new(source):
+        status = market_data.source_status.get(source, {})
+        if status.get('state') != 'live' or status['fetched_at'] <= market_data.recorded_at.get(source, 0):
+            return False
+        market_data.recorded_at[source] = status['fetched_at']
+        return True
+    
+    fresh_rates = {}
+    if enhanced_forex and is_new('forex'):
+        fresh_rates.update({code: info['rate'] for code, info in enhanced_forex.items() if info['rate'] > 0})
+    if crypto_data and is_new('crypto'):
+        fresh_rates.update({code: static_data[code]['rate'] for code in static_data
+                            if static_data[code].get('central_bank') == 'Decentralized' and static_data[code]['rate'] > 0})
+    if fresh_rates:
+        rate_history.append(time.time(), fresh_rates)
+        correlation_engine.observe([code for code in static_data if code != 'USD'])
+    
+    for code, history in rate_history.stats([code for code in static_data if code != 'USD'],
+                                            min_span_h=RATE_HISTORY_MIN_SPAN_H).items():
+        static_data[code].update(history)
+    
+    frame = CurrencyFrame(static_data)
+    alert_engine.evaluate(frame)
+    return static_data, rate_date, frame
+
+# Stale-while-revalidate rate cache: readers always get the last snapshot immediately,
+# and a background thread rebuilds it once it is older than refresh_after
+class RateCache:
+    def __init__(self, builder, refresh_after=90):
+        self.builder = builder
+        self.refresh_after = refresh_after
+        self.snapshot = None
+        self.snapshot_id = 0
+        self.epoch = f"{time.time_ns():x}"[-6:]
+        self.current = (0, None)
+        self._recent = deque(maxlen=4)
+        self.fetched_at = 0.0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_error = None
+        self._refreshing = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self._cold = threading.Lock()
+    
+    def age(self):
+        return time.time() - self.fetched_at
+    
+    def get(self):
+        """(snapshot_id, snapshot) of the newest snapshot, read as one pair"""
+        if self.snapshot is None:
+            # Cold start: the first caller builds synchronously, concurrent callers wait on it
+            with self._cold:
+                if self.snapshot is None:
+                    # Nothing to fall back on yet, so a failed first build is the caller's error
+                    self._refresh(raise_errors=True)
+        elif self.age() >= self.refresh_after:
+            self.refresh()
+        return self.current
+    
+    def previous(self, snapshot_id):
+        """(snapshot_id, snapshot) built just before the given one, if still held"""
+        with self._lock:
+            recent = list(self._recent)
+        for (prev_id, prev), (curr_id, _) in zip(recent, recent[1:]):
+            if curr_id == snapshot_id:
+                return prev_id, prev
+        return None
+    
+    def refresh(self, wait=False):
+        """Start a background rebuild unless one is already running"""
+        with self._lock:
+            if not self._refreshing:
+                self._refreshing = True
+                self._thread = threading.Thread(target=self._refresh, daemon=True, name="rate-cache-refresh")
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join()
+    
+    def _refresh(self, raise_errors=False):
+        try:
+            snapshot = self.builder()
+            with self._lock:
+                self.snapshot = snapshot
+                self.snapshot_id += 1
+                # Snapshot keys stay unique across cache instances, since memoized panels outlive them
+                self.current = (f"{self.epoch}-{self.snapshot_id}", snapshot)
+                self._recent.append(self.current)
+                self.fetched_at = time.time()
+                self.refreshes += 1
+                self.last_error = None
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+            if raise_errors:
+                raise
+            # Readers keep the previous snapshot; the next get() past refresh_after retries
+            logger.exception("Rate snapshot refresh failed")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+@st.cache_resource
+def get_rate_cache():
+    return RateCache(get_enhanced_currency_data)
+
+rate_cache = get_rate_cache()
 
 # Get stock data
-@st.cache_data(ttl=300)
 def get_stock_indices():
     indices = {
         'S&P 500': {'value': 4567.89 + random.uniform(-50, 50), 'change': random.uniform(-2, 2), 'currency': 'USD'},
@@ -297,7 +1067,6 @@ def get_stock_indices():
     return indices
 
 # Market news
-@st.cache_data(ttl=600)
 def fetch_market_news():
     return [
         {"title": "Federal Reserve Signals Potential Rate Cut", "impact": "USD", "time": "2 hours ago", "sentiment": "bearish"},
@@ -307,9 +1076,24 @@ def fetch_market_news():
         {"title": "Bitcoin ETF Sees Record Inflows", "impact": "BTC", "time": "3 hours ago", "sentiment": "bullish"},
     ]
 
+# Named cache regions, invalidated individually from the Refresh Data menu
+@st.cache_resource
+def get_cache_regions():
+    return {
+        **market_data.regions,
+        'indices': CacheRegion('indices', get_stock_indices, ttl=300, min_refresh_interval=60),
+        'news': CacheRegion('news', fetch_market_news, ttl=600, min_refresh_interval=120),
+    }
+
+cache_regions = get_cache_regions()
+
 # Get data
-CURRENCY_DATA, last_update = get_enhanced_currency_data()
-STOCK_INDICES = get_stock_indices()
+try:
+    SNAPSHOT_ID, (CURRENCY_DATA, last_update, CURRENCY_FRAME) = rate_cache.get()
+except Exception as e:
+    st.error(f"❌ Could not build the currency snapshot: {e}")
+    st.stop()
+STOCK_INDICES = cache_regions['indices'].get()
 
 # Header with live indicator
 col_header1, col_header2 = st.columns([3, 1])
@@ -325,14 +1109,160 @@ with col_header2:
     </div>
     ''', unsafe_allow_html=True)
     
-    if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
-        st.rerun()
+    for badge in market_data.staleness_badges():
+        st.caption(badge)
+    
+    # Refresh one region at a time; everything else keeps serving from cache
+    with st.popover("🔄 Refresh Data"):
+        for name, region in cache_regions.items():
+            age = region.age()
+            label = f"{name.title()} · {age:.0f}s old" if age is not None else name.title()
+            if st.button(label, key=f"refresh_{name}", use_container_width=True):
+                if not region.request_refresh():
+                    st.warning(f"{name.title()} was just refreshed; try again in {region.retry_in():.0f}s")
+                else:
+                    if name in market_data.regions:
+                        rate_cache.refresh(wait=True)
+                    st.rerun()
 
 # Market sentiment analysis
+PANELS = compute_market_panels(SNAPSHOT_ID, CURRENCY_FRAME)
+
+# Cross rates for one snapshot. Rates are units per USD, so converting a long position
+# from X to T sells X at its ask and buys T at its bid: bid[X, T] = bid_T / ask_X; shorts
+# are covered at ask[X, T] = ask_T / bid_X. Currencies without quotes fall back to mid.
+class CrossRateMatrix:
+    def __init__(self, frame):
+        self.codes = frame.codes
+        self.index = pd.Index(frame.codes)
+        mid = np.where(frame.rate > 0, frame.rate, np.nan)
+        bid = np.where(np.isnan(frame.bid), mid, frame.bid)
+        ask = np.where(np.isnan(frame.ask), mid, frame.ask)
+        self.mid = mid[None, :] / mid[:, None]
+        self.bid = bid[None, :] / ask[:, None]
+        self.ask = ask[None, :] / bid[:, None]
+    
+    def positions(self, codes):
+        """Row indices for position codes; -1 where the snapshot has no such currency"""
+        # Normalise the few distinct codes, not every position
+        position_codes, uniques = pd.factorize(np.asarray(codes))
+        lookup = self.index.get_indexer(pd.Index(uniques).str.upper().str.strip())
+        return np.where(position_codes >= 0, lookup[position_codes], -1)
+    
+    def value(self, idx, amounts, target):
+        """Net exposure per currency and its liquidation value in `target`"""
+        t = self.index.get_loc(target)
+        known = idx >= 0
+        exposures = np.bincount(idx[known], weights=amounts[known], minlength=len(self.codes))
+        values = np.where(exposures >= 0, exposures * self.bid[:, t], exposures * self.ask[:, t])
+        return exposures, values
+
+@st.cache_resource(max_entries=8)
+def cross_rate_matrix(snapshot_id, _frame):
+    return CrossRateMatrix(_frame)
+
+def value_portfolio(portfolio, target):
+    """Value a (currency, amount) DataFrame in `target`, with P&L against the previous snapshot"""
+    started = time.perf_counter()
+    matrix = cross_rate_matrix(SNAPSHOT_ID, CURRENCY_FRAME)
+    # Rows added with "+" in the editor stay blank until filled in; value complete positions only
+    amounts = pd.to_numeric(portfolio['amount'], errors='coerce')
+    currencies = portfolio['currency'].where(portfolio['currency'].notna(), '').astype(str).str.strip()
+    complete = (currencies != '') & amounts.notna()
+    currencies = currencies[complete]
+    amounts = amounts[complete].to_numpy(dtype=float)
+    idx = matrix.positions(currencies)
+    exposures, values = matrix.value(idx, amounts, target)
+    
+    pnl = np.full(len(values), np.nan)
+    previous = rate_cache.previous(SNAPSHOT_ID)
+    if previous is not None:
+        prev_id, (_, _, prev_frame) = previous
+        prev_matrix = cross_rate_matrix(prev_id, prev_frame)
+        if target in prev_matrix.index:
+            # Same exposures, valued at the previous snapshot's cross rates
+            t = prev_matrix.index.get_loc(target)
+            prev_idx = prev_matrix.index.get_indexer(matrix.codes)
+            found = prev_idx >= 0
+            prev_values = np.full(len(values), np.nan)
+            prev_values[found] = np.where(exposures[found] >= 0,
+                                          exposures[found] * prev_matrix.bid[prev_idx[found], t],
+                                          exposures[found] * prev_matrix.ask[prev_idx[found], t])
+            pnl = values - prev_values
+    
+    held = exposures != 0
+    total = np.nansum(values[held])
+    exposure_df = pd.DataFrame({
+        'Currency': matrix.codes[held],
+        'Net Amount': exposures[held],
+        f'Value ({target})': values[held],
+        'Share %': values[held] / total * 100 if total else np.nan,
+        f'P&L ({target})': pnl[held],
+    }).sort_values(f'Value ({target})', ascending=False, key=np.abs)
+    return {
+        'total': total,
+        'pnl': np.nansum(pnl[held]) if not np.isnan(pnl[held]).all() else None,
+        'positions': len(amounts),
+        'unknown': sorted(set(currencies[idx < 0])),
+        'exposures': exposure_df,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    }
+
+# Chart builders: one batched trace per chart, built once per snapshot and shared by every
+# session (cache_resource hands out the same figure object instead of unpickling a copy)
+@st.cache_resource(max_entries=8)
+def risk_return_figure(snapshot_id, _frame):
+    frame = _frame
+    shown = (frame.codes != 'USD') & ~np.isnan(frame.volatility) & ~np.isnan(frame.change_24h)
+    fig = go.Figure(go.Scatter(
+        x=frame.volatility[shown],
+        y=frame.change_24h[shown],
+        mode='markers+text',
+        text=frame.codes[shown],
+        textposition="middle right",
+        customdata=np.nan_to_num(frame.interest_rate[shown]),
+        marker=dict(
+            size=15,
+            color=frame.change_24h[shown],
+            colorscale='RdYlGn',
+            showscale=True,
+            colorbar=dict(title="24h Change %")
+        ),
+        hovertemplate="<b>%{text}</b><br>" +
+                      "Volatility: %{x:.1f}%<br>" +
+                      "24h Change: %{y:+.2f}%<br>" +
+                      "Interest Rate: %{customdata:.2f}%<extra></extra>"
+    ))
+    
+    fig.update_layout(
+        title="Currency Risk-Return Matrix",
+        xaxis_title="Volatility (%)",
+        yaxis_title="24h Performance (%)",
+        template="plotly_dark",
+        height=500,
+        showlegend=False
+    )
+    
+    # Add quadrant lines
+    fig.add_hline(y=0, line_dash="dash", line_color="rgba(255,255,255,0.5)")
+    fig.add_vline(x=1, line_dash="dash", line_color="rgba(255,255,255,0.5)")
+    return fig
+
+@st.cache_resource(max_entries=8)
+def correlation_figure(snapshot_id, window):
+    codes, matrix = correlation_engine.matrix(window)
+    if not codes or np.isnan(matrix).all():
+        return None
+    fig = go.Figure(go.Heatmap(
+        z=matrix, x=codes, y=codes,
+        zmin=-1, zmax=1, colorscale='RdBu', reversescale=True,
+        hovertemplate="%{y} / %{x}: %{z:.2f}<extra></extra>"
+    ))
+    fig.update_layout(template="plotly_dark", height=400, margin=dict(l=10, r=10, t=10, b=10))
+    return fig
+
 def calculate_market_sentiment():
-    total_change = sum(data['change_24h'] for data in CURRENCY_DATA.values() if 'change_24h' in data)
-    avg_change = total_change / len([d for d in CURRENCY_DATA.values() if 'change_24h' in d])
+    avg_change = PANELS['avg_change']
     
     if avg_change > 0.5:
         return "Very Bullish 🚀", "#00ff00", avg_change
@@ -345,17 +1275,21 @@ def calculate_market_sentiment():
 
 sentiment_label, sentiment_color, sentiment_score = calculate_market_sentiment()
 
-# Live Market Alerts
-market_alerts = []
-for curr, data in CURRENCY_DATA.items():
-    if 'change_24h' in data and abs(data['change_24h']) > 1.5:
-        alert_type = "🚨" if abs(data['change_24h']) > 2.5 else "⚠️"
-        market_alerts.append(f"{alert_type} {curr} moved {data['change_24h']:+.2f}% in 24h")
+# Live Market Alerts: default and this session's rules that fired in the last 24h
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+market_alerts = alert_engine.events_for(st.session_state.session_id, since=time.time() - 86400)
 
 if market_alerts:
     st.markdown("### 📢 Live Market Alerts")
     for alert in market_alerts[:3]:
-        st.markdown(f'<div class="alert-box">{alert}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="alert-box">{AlertEngine.describe(alert)}</div>', unsafe_allow_html=True)
+    if len(market_alerts) > 3:
+        with st.expander(f"Alert history ({len(market_alerts)})"):
+            st.dataframe(pd.DataFrame({
+                'Time': [datetime.fromtimestamp(alert['time']).strftime("%H:%M:%S") for alert in market_alerts],
+                'Alert': [AlertEngine.describe(alert) for alert in market_alerts],
+            }), use_container_width=True, hide_index=True)
 
 # Market Sentiment Display
 st.markdown("### 🎭 Real-Time Market Sentiment")
@@ -385,7 +1319,7 @@ with sent_col2:
 
 with sent_col3:
     # Volatility Index
-    avg_volatility = np.mean([data.get('volatility', 1) for data in CURRENCY_DATA.values()])
+    avg_volatility = PANELS['avg_volatility']
     vol_color = "#ff4444" if avg_volatility > 1.5 else "#ffbb33" if avg_volatility > 1 else "#00c851"
     st.markdown(f'''
     <div class="metric-card">
@@ -398,11 +1332,42 @@ with sent_col3:
 # Enhanced Sidebar
 st.sidebar.title("📊 Live Market Dashboard")
 
-# Auto-refresh toggle
+# Auto-refresh toggle: a timer fragment polls the rate cache and only reruns the page
+# when a newer snapshot has landed, so nothing blocks the script thread
 auto_refresh = st.sidebar.checkbox("🔄 Auto-refresh (30s)", value=False)
-if auto_refresh:
-    time.sleep(30)
-    st.rerun()
+
+def watch_rate_snapshot():
+    if rate_cache.get()[0] != SNAPSHOT_ID:
+        st.rerun(scope="app")
+    st.caption(f"Rates snapshot #{rate_cache.snapshot_id} · {rate_cache.age():.0f}s old")
+    if rate_cache.last_error and rate_cache.age() >= rate_cache.refresh_after:
+        st.caption(f"⚠️ Last refresh failed ({rate_cache.last_error}); showing the previous snapshot")
+
+with st.sidebar:
+    st.fragment(run_every=30 if auto_refresh else None)(watch_rate_snapshot)()
+
+# User-defined alert rules, evaluated once per snapshot for every session
+with st.sidebar.expander("🔔 My Alerts"):
+    with st.form("alert_rule", clear_on_submit=True):
+        alert_metric = st.selectbox("Metric", list(AlertEngine.METRICS.keys()), format_func=AlertEngine.METRICS.get)
+        alert_code = st.text_input("Currency or pair", value="EUR", help="e.g. EUR, BTC or EUR/GBP (pairs: level only)")
+        alert_direction = st.radio("When", ["above", "below"], horizontal=True)
+        alert_threshold = st.number_input("Threshold", value=1.0, format="%.4f")
+        if st.form_submit_button("Add Alert"):
+            code = alert_code.strip().upper()
+            if '/' in code and alert_metric != 'rate':
+                st.error("Pair alerts support the level metric only")
+            else:
+                alert_engine.add_rule(alert_metric, code, alert_direction, alert_threshold,
+                                      owner=st.session_state.session_id, severity='critical')
+    my_rules = alert_engine.rules_for(st.session_state.session_id)
+    for rule in my_rules[:10]:
+        st.caption(f"{rule['code']} {AlertEngine.METRICS[rule['metric']]} {rule['direction']} {rule['threshold']:g}")
+    if my_rules and st.button("Clear my alerts"):
+        for rule in my_rules:
+            alert_engine.remove_rule(rule['id'])
+        st.rerun()
+    st.caption(f"{len(alert_engine.rules):,} rules · last check {alert_engine.last_eval_ms:.1f} ms")
 
 st.sidebar.markdown(f'''
 <div style="background: {sentiment_color}; border-radius: 10px; padding: 1rem; text-align: center; color: white; margin-bottom: 1rem;">
@@ -425,11 +1390,7 @@ for index, data in STOCK_INDICES.items():
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔥 Top Movers (24h)")
-sorted_currencies = sorted(
-    [(k, v) for k, v in CURRENCY_DATA.items() if 'change_24h' in v], 
-    key=lambda x: abs(x[1]['change_24h']), 
-    reverse=True
-)[:5]
+sorted_currencies = [(curr, CURRENCY_DATA[curr]) for curr in PANELS['top_movers']]
 
 for curr, data in sorted_currencies:
     if curr != 'USD':
@@ -440,7 +1401,7 @@ for curr, data in sorted_currencies:
 # Market News
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📰 Market News")
-news_items = fetch_market_news()
+news_items = cache_regions['news'].get()
 for news in news_items[:3]:
     sentiment_emoji = "🟢" if news['sentiment'] == 'bullish' else "🔴" if news['sentiment'] == 'bearish' else "🟡"
     st.sidebar.markdown(f'''
@@ -573,6 +1534,40 @@ with col2:
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+# Portfolio Valuation
+st.markdown("---")
+st.subheader("💼 Portfolio Valuation")
+
+portfolio_col1, portfolio_col2 = st.columns([1, 2])
+
+with portfolio_col1:
+    target_currency = st.selectbox("Value In", list(CURRENCY_DATA.keys()), key="portfolio_target")
+    uploaded = st.file_uploader("Upload positions (CSV with currency, amount)", type="csv")
+    if uploaded is not None:
+        portfolio = pd.read_csv(uploaded)
+        portfolio.columns = [column.strip().lower() for column in portfolio.columns]
+    else:
+        portfolio = st.data_editor(
+            pd.DataFrame({'currency': ['EUR', 'GBP', 'JPY'], 'amount': [10000.0, 5000.0, 1000000.0]}),
+            num_rows="dynamic", key="portfolio_editor", use_container_width=True
+        )
+
+with portfolio_col2:
+    if not {'currency', 'amount'}.issubset(portfolio.columns):
+        st.error("The CSV needs 'currency' and 'amount' columns.")
+    elif len(portfolio):
+        valuation = value_portfolio(portfolio, target_currency)
+        target_symbol = CURRENCY_DATA[target_currency]['symbol']
+        val_col1, val_col2, val_col3 = st.columns(3)
+        val_col1.metric("Total Value", f"{target_symbol}{valuation['total']:,.2f}")
+        val_col2.metric("P&L vs Previous Snapshot",
+                        f"{target_symbol}{valuation['pnl']:+,.2f}" if valuation['pnl'] is not None else "N/A")
+        val_col3.metric("Positions", f"{valuation['positions']:,}")
+        st.dataframe(valuation['exposures'], use_container_width=True, hide_index=True)
+        st.caption(f"Valued at bid/ask in {valuation['elapsed_ms']:.1f} ms")
+        if valuation['unknown']:
+            st.warning(f"No rate for: {', '.join(valuation['unknown'][:10])}")
+
 # Advanced Market Analysis
 st.markdown("---")
 st.subheader("📈 Advanced Market Analysis")
@@ -581,44 +1576,7 @@ analysis_col1, analysis_col2 = st.columns([2, 1])
 
 with analysis_col1:
     # Volatility vs Performance Chart
-    fig = go.Figure()
-    
-    for curr, data in CURRENCY_DATA.items():
-        if curr != 'USD' and 'volatility' in data and 'change_24h' in data:
-            fig.add_trace(go.Scatter(
-                x=[data['volatility']],
-                y=[data['change_24h']],
-                mode='markers+text',
-                text=[curr],
-                textposition="middle right",
-                marker=dict(
-                    size=15,
-                    color=data['change_24h'],
-                    colorscale='RdYlGn',
-                    showscale=True,
-                    colorbar=dict(title="24h Change %")
-                ),
-                name=curr,
-                hovertemplate=f"<b>{curr}</b><br>" +
-                            f"Volatility: {data['volatility']:.1f}%<br>" +
-                            f"24h Change: {data['change_24h']:+.2f}%<br>" +
-                            f"Interest Rate: {data.get('interest_rate', 0):.2f}%<extra></extra>"
-            ))
-    
-    fig.update_layout(
-        title="Currency Risk-Return Matrix",
-        xaxis_title="Volatility (%)",
-        yaxis_title="24h Performance (%)",
-        template="plotly_dark",
-        height=500,
-        showlegend=False
-    )
-    
-    # Add quadrant lines
-    fig.add_hline(y=0, line_dash="dash", line_color="rgba(255,255,255,0.5)")
-    fig.add_vline(x=1, line_dash="dash", line_color="rgba(255,255,255,0.5)")
-    
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(risk_return_figure(SNAPSHOT_ID, CURRENCY_FRAME), use_container_width=True)
 
 with analysis_col2:
     st.markdown("### 🎯 Trading Signals")
@@ -627,32 +1585,24 @@ with analysis_col2:
     signals = []
     
     # Momentum signal
-    best_performer = max(
-        [(k, v) for k, v in CURRENCY_DATA.items() if k != 'USD' and 'change_24h' in v], 
-        key=lambda x: x[1]['change_24h']
-    )
-    if best_performer[1]['change_24h'] > 1:
-        signals.append(f"🚀 BUY {best_performer[0]} - Strong momentum ({best_performer[1]['change_24h']:+.1f}%)")
+    best_performer = PANELS['best_performer']
+    if best_performer and CURRENCY_DATA[best_performer]['change_24h'] > 1:
+        signals.append(f"🚀 BUY {best_performer} - Strong momentum ({CURRENCY_DATA[best_performer]['change_24h']:+.1f}%)")
     
     # Mean reversion signal
-    worst_performer = min(
-        [(k, v) for k, v in CURRENCY_DATA.items() if k != 'USD' and 'change_24h' in v], 
-        key=lambda x: x[1]['change_24h']
-    )
-    if worst_performer[1]['change_24h'] < -1:
-        signals.append(f"🔄 WATCH {worst_performer[0]} - Potential reversal ({worst_performer[1]['change_24h']:+.1f}%)")
+    worst_performer = PANELS['worst_performer']
+    if worst_performer and CURRENCY_DATA[worst_performer]['change_24h'] < -1:
+        signals.append(f"🔄 WATCH {worst_performer} - Potential reversal ({CURRENCY_DATA[worst_performer]['change_24h']:+.1f}%)")
     
     # Carry trade signal
-    high_yield_currencies = [(k, v) for k, v in CURRENCY_DATA.items() if v.get('interest_rate', 0) > 4 and k != 'USD']
-    if high_yield_currencies:
-        best_carry = max(high_yield_currencies, key=lambda x: x[1]['interest_rate'])
-        signals.append(f"💰 CARRY {best_carry[0]} - High yield ({best_carry[1]['interest_rate']:.1f}%)")
+    best_carry = PANELS['best_carry']
+    if best_carry:
+        signals.append(f"💰 CARRY {best_carry} - High yield ({CURRENCY_DATA[best_carry]['interest_rate']:.1f}%)")
     
     # Volatility signal
-    low_vol_currencies = [(k, v) for k, v in CURRENCY_DATA.items() if v.get('volatility', 1) < 1 and k != 'USD']
-    if low_vol_currencies:
-        safest = min(low_vol_currencies, key=lambda x: x[1]['volatility'])
-        signals.append(f"🛡️ SAFE HAVEN {safest[0]} - Low vol ({safest[1]['volatility']:.1f}%)")
+    safest = PANELS['safest']
+    if safest:
+        signals.append(f"🛡️ SAFE HAVEN {safest} - Low vol ({CURRENCY_DATA[safest]['volatility']:.1f}%)")
     
     for signal in signals:
         st.markdown(f'''
@@ -661,23 +1611,14 @@ with analysis_col2:
         </div>
         ''', unsafe_allow_html=True)
     
-    # Market correlation matrix (simplified)
+    # Correlation of log returns (vs USD) over the stored rate history
     st.markdown("### 🔗 Market Correlations")
-    correlations = {
-        'EUR-USD': random.uniform(0.6, 0.8),
-        'GBP-USD': random.uniform(0.7, 0.9),
-        'JPY-USD': random.uniform(-0.4, -0.2),
-        'Gold-USD': random.uniform(-0.3, -0.1),
-        'BTC-USD': random.uniform(-0.1, 0.3)
-    }
-    
-    for pair, corr in correlations.items():
-        color = "#00c851" if abs(corr) > 0.7 else "#ffbb33" if abs(corr) > 0.4 else "#ff4444"
-        st.markdown(f'''
-        <div style="background: {color}; border-radius: 5px; padding: 0.5rem; margin: 0.2rem 0; color: white;">
-            <strong>{pair}</strong>: {corr:.2f}
-        </div>
-        ''', unsafe_allow_html=True)
+    corr_window = st.selectbox("Window", list(CORRELATION_WINDOWS.keys()), label_visibility="collapsed")
+    corr_fig = correlation_figure(SNAPSHOT_ID, corr_window)
+    if corr_fig is not None:
+        st.plotly_chart(corr_fig, use_container_width=True)
+    else:
+        st.info("Correlations appear once a few live snapshots have been recorded.")
 
 # Live Economic Calendar
 st.markdown("---")
@@ -733,22 +1674,15 @@ st.markdown("---")
 st.subheader("📋 Complete Market Overview")
 
 # Create comprehensive market table
-market_df_data = []
-for curr, data in CURRENCY_DATA.items():
-    market_df_data.append({
-        'Currency': curr,
-        'Name': data.get('name', 'N/A'),
-        'Rate (USD)': f"{data['rate']:.6f}",
-        '24h Change': f"{data.get('change_24h', 0):+.2f}%",
-        'Volatility': f"{data.get('volatility', 0):.1f}%",
-        'Volume 24h': f"${data.get('volume_24h', 0):,.0f}" if 'volume_24h' in data else 'N/A',
-        'Market Cap': f"${data.get('market_cap', 0):,.0f}" if 'market_cap' in data else 'N/A',
-        'Interest Rate': f"{data.get('interest_rate', 0):.2f}%",
-        'Last Update': data.get('last_update', 'N/A')
-    })
+table_col1, table_col2 = st.columns([3, 1])
+with table_col1:
+    table_query = st.text_input("Filter by code or name", placeholder="e.g. EUR or dollar")
+with table_col2:
+    table_min_move = st.number_input("Min |24h change| %", min_value=0.0, value=0.0, step=0.5)
 
-market_df = pd.DataFrame(market_df_data)
-st.dataframe(market_df, use_container_width=True, hide_index=True)
+market_df = filter_market_table(PANELS['market_table'], table_query.strip(), table_min_move)
+st.dataframe(market_df, use_container_width=True, hide_index=True, column_config=MARKET_TABLE_COLUMNS)
+st.caption(f"{len(market_df):,} of {len(PANELS['market_table']):,} instruments")
 
 # Performance Analytics
 st.markdown("---")
@@ -759,11 +1693,7 @@ perf_col1, perf_col2, perf_col3 = st.columns(3)
 with perf_col1:
     # Best performers
     st.markdown("#### 🏆 Best Performers")
-    best_performers = sorted(
-        [(k, v) for k, v in CURRENCY_DATA.items() if 'change_24h' in v],
-        key=lambda x: x[1]['change_24h'],
-        reverse=True
-    )[:3]
+    best_performers = [(curr, CURRENCY_DATA[curr]) for curr in PANELS['best_performers']]
     
     for i, (curr, data) in enumerate(best_performers):
         medal = "🥇" if i == 0 else "🥈" if i == 1 else "🥉"
@@ -778,10 +1708,7 @@ with perf_col1:
 with perf_col2:
     # Worst performers
     st.markdown("#### 📉 Worst Performers")
-    worst_performers = sorted(
-        [(k, v) for k, v in CURRENCY_DATA.items() if 'change_24h' in v],
-        key=lambda x: x[1]['change_24h']
-    )[:3]
+    worst_performers = [(curr, CURRENCY_DATA[curr]) for curr in PANELS['worst_performers']]
     
     for i, (curr, data) in enumerate(worst_performers):
         st.markdown(f'''
@@ -795,11 +1722,7 @@ with perf_col2:
 with perf_col3:
     # Most volatile
     st.markdown("#### 🌪️ Most Volatile")
-    most_volatile = sorted(
-        [(k, v) for k, v in CURRENCY_DATA.items() if 'volatility' in v],
-        key=lambda x: x[1]['volatility'],
-        reverse=True
-    )[:3]
+    most_volatile = [(curr, CURRENCY_DATA[curr]) for curr in PANELS['most_volatile']]
     
     for curr, data in most_volatile:
         st.markdown(f'''
@@ -815,12 +1738,13 @@ st.markdown("---")
 footer_col1, footer_col2, footer_col3 = st.columns(3)
 
 with footer_col1:
-    st.markdown('''
+    st.markdown(f'''
     <div class="metric-card">
         <strong>📡 Data Sources</strong><br>
         • ExchangeRate-API (Forex)<br>
         • CoinGecko API (Crypto)<br>
-        • Simulated Stock Data
+        • Simulated Stock Data<br>
+        <small>HTTP mode: {market_data.transport.mode}</small>
     </div>
     ''', unsafe_allow_html=True)
 
@@ -829,7 +1753,7 @@ with footer_col2:
     <div class="metric-card">
         <strong>⏰ Last Updated</strong><br>
         {datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")}<br>
-        Cache TTL: 60-300 seconds
+        Rates refresh in background after {rate_cache.refresh_after}s
     </div>
     ''', unsafe_allow_html=True)
 
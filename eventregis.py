@@ -1,8 +1,15 @@
 import streamlit as st
+from streamlit import runtime
 import pandas as pd
 from datetime import datetime
 import io
 import json
+import sqlite3
+import threading
+import time
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Page configuration
 st.set_page_config(
@@ -50,10 +57,123 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Registrations live in one SQLite database shared by every session (and every server
+# process). WAL mode lets readers run while a writer commits; ids come from AUTOINCREMENT,
+# so concurrent inserts can never hand out the same id. Per-event and per-day counters are
+# updated in the same transaction as each insert, so statistics never scan registrations.
+DB_PATH = os.environ.get("EVENTREGIS_DB", "event_registrations.db")
+
+class RegistrationStore:
+    COLUMNS = ['id', 'name', 'email', 'event', 'timestamp', 'date']
+    
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS registrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL,
+                event TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                date TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_registrations_date ON registrations (date);
+            CREATE TABLE IF NOT EXISTS event_counts (
+                event TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS daily_counts (
+                date TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+        ''')
+        self._backfill_counters(conn)
+    
+    def _backfill_counters(self, conn):
+        # Databases written before the counter tables existed get them rebuilt once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM event_counts LIMIT 1").fetchone() is None:
+                conn.execute("DELETE FROM daily_counts")
+                conn.execute("INSERT INTO event_counts SELECT event, COUNT(*) FROM registrations GROUP BY event")
+                conn.execute("INSERT INTO daily_counts SELECT date, COUNT(*) FROM registrations GROUP BY date")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def _connection(self):
+        # sqlite3 connections are per thread; each Streamlit session thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def add(self, name, email, event, now=None):
+        now = now or datetime.now()
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so the insert never deadlocks on upgrade
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT INTO registrations (name, email, event, timestamp, date) VALUES (?, ?, ?, ?, ?)",
+                (name, email, event, now.strftime("%Y-%m-%d %H:%M:%S"), now.strftime("%Y-%m-%d"))
+            )
+            conn.execute(
+                "INSERT INTO event_counts (event, count) VALUES (?, 1) "
+                "ON CONFLICT(event) DO UPDATE SET count = count + 1", (event,)
+            )
+            conn.execute(
+                "INSERT INTO daily_counts (date, count) VALUES (?, 1) "
+                "ON CONFLICT(date) DO UPDATE SET count = count + 1", (now.strftime("%Y-%m-%d"),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.lastrowid
+    
+    def count(self):
+        return self._connection().execute("SELECT COALESCE(SUM(count), 0) FROM event_counts").fetchone()[0]
+    
+    def count_on(self, date):
+        row = self._connection().execute("SELECT count FROM daily_counts WHERE date = ?", (date,)).fetchone()
+        return row[0] if row else 0
+    
+    def count_by_event(self):
+        return dict(self._connection().execute("SELECT event, count FROM event_counts WHERE count > 0").fetchall())
+    
+    def recent(self, limit=5):
+        rows = self._connection().execute(
+            "SELECT id, name, email, event, timestamp, date FROM registrations ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+    
+    def all(self):
+        return pd.read_sql_query("SELECT * FROM registrations ORDER BY id", self._connection())
+    
+    def clear(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("registrations", "event_counts", "daily_counts"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+@st.cache_resource
+def get_store():
+    return RegistrationStore()
+
 # Initialize session state
 def init_session_state():
-    if 'registrations' not in st.session_state:
-        st.session_state.registrations = []
     if 'show_success' not in st.session_state:
         st.session_state.show_success = False
     if 'success_message' not in st.session_state:
@@ -73,46 +193,30 @@ EVENTS = [
 
 # Function to add registration
 def add_registration(name, email, event):
-    registration = {
-        'id': len(st.session_state.registrations) + 1,
-        'name': name,
-        'email': email,
-        'event': event,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'date': datetime.now().strftime("%Y-%m-%d")
-    }
-    st.session_state.registrations.append(registration)
+    get_store().add(name, email, event)
     st.session_state.show_success = True
     st.session_state.success_message = f"Successfully registered {name} for {event}!"
 
 # Function to get statistics
 def get_statistics():
-    if not st.session_state.registrations:
-        return {
-            'total': 0,
-            'today': 0,
-            'by_event': {},
-            'recent': []
-        }
-    
-    df = pd.DataFrame(st.session_state.registrations)
+    store = get_store()
     today = datetime.now().strftime("%Y-%m-%d")
     
     stats = {
-        'total': len(df),
-        'today': len(df[df['date'] == today]),
-        'by_event': df['event'].value_counts().to_dict(),
-        'recent': df.tail(5).to_dict('records')
+        'total': store.count(),
+        'today': store.count_on(today),
+        'by_event': store.count_by_event(),
+        'recent': store.recent(5)[::-1]
     }
     
     return stats
 
 # Function to export to CSV
 def export_to_csv():
-    if not st.session_state.registrations:
+    df = get_store().all()
+    if df.empty:
         return None
     
-    df = pd.DataFrame(st.session_state.registrations)
     df = df[['name', 'email', 'event', 'timestamp']]  # Select relevant columns
     df.columns = ['Name', 'Email', 'Event', 'Registration Date']
     
@@ -218,36 +322,35 @@ def main():
         
         # Export functionality
         st.markdown("#### 📥 Data Export")
-        if st.session_state.registrations:
-            csv_data = export_to_csv()
-            if csv_data:
-                st.download_button(
-                    label=f"📥 Export CSV ({len(st.session_state.registrations)} records)",
-                    data=csv_data,
-                    file_name=f"event_registrations_{datetime.now().strftime('%Y-%m-%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+        if stats['total']:
+            # The CSV is only built when the button is clicked, not on every page load
+            st.download_button(
+                label=f"📥 Export CSV ({stats['total']} records)",
+                data=lambda: export_to_csv() or "",
+                file_name=f"event_registrations_{datetime.now().strftime('%Y-%m-%d')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
         else:
             st.info("No data to export")
         
         # Clear data functionality
         st.markdown("#### 🗑️ Data Management")
         if st.button("Clear All Data", type="secondary", use_container_width=True):
-            if st.session_state.registrations:
-                st.session_state.registrations = []
+            if stats['total']:
+                get_store().clear()
                 st.success("All registration data cleared!")
                 st.rerun()
             else:
                 st.info("No data to clear")
         
         # Display total records
-        st.info(f"Total Records: {len(st.session_state.registrations)}")
+        st.info(f"Total Records: {stats['total']}")
         
         # Raw data view (for debugging)
         if st.checkbox("Show Raw Data"):
-            if st.session_state.registrations:
-                st.json(st.session_state.registrations)
+            if stats['total']:
+                st.json(get_store().all().to_dict('records'))
             else:
                 st.write("No data available")
     
@@ -263,5 +366,53 @@ def main():
     if st.button("🔄 Refresh", help="Click to refresh the statistics"):
         st.rerun()
 
+# Load test: many threads registering at once against one database file
+def run_load_test(registrations=5000, threads=16, path="eventregis_loadtest.db"):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    store = RegistrationStore(path)
+    latencies = []
+    lock = threading.Lock()
+    
+    def register(i):
+        started = time.perf_counter()
+        registration_id = store.add(f"Load Test {i}", f"user{i}@example.com", EVENTS[i % len(EVENTS)])
+        with lock:
+            latencies.append(time.perf_counter() - started)
+        return registration_id
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ids = list(pool.map(register, range(registrations)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'registrations': registrations,
+        'threads': threads,
+        'seconds': round(elapsed, 2),
+        'per_second': round(registrations / elapsed),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        'unique_ids': len(set(ids)) == registrations,
+        'rows_stored': store.count(),
+        'counters_match': store.count() == store._connection().execute("SELECT COUNT(*) FROM registrations").fetchone()[0],
+    }
+
+def run_cli():
+    parser = argparse.ArgumentParser(description="Event registration tools (run with `streamlit run` for the app)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    loadtest = commands.add_parser("loadtest", help="concurrent registrations against a scratch database")
+    loadtest.add_argument("--registrations", type=int, default=5000)
+    loadtest.add_argument("--threads", type=int, default=16)
+    loadtest.add_argument("--db", default="eventregis_loadtest.db")
+    args = parser.parse_args()
+    if args.command == "loadtest":
+        for key, value in run_load_test(args.registrations, args.threads, args.db).items():
+            print(f"{key:>14}: {value}")
+
 if __name__ == "__main__":
-    main()
+    if runtime.exists():
+        main()
+    else:
+        run_cli()